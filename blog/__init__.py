@@ -1,35 +1,78 @@
 import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_mail import Mail
+from blog.config import Config
+from blog.database import RoutingSession, configure_binds, configure_engines
 
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = str(os.environ.get('BlogKey'))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
-db = SQLAlchemy(app)
-migrate = Migrate(app, db, render_as_batch=True)
-bcrypt = Bcrypt(app)
-login_manager = LoginManager(app)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
+login_manager = LoginManager()
 login_manager.login_view = 'users.login'
 login_manager.login_message_category = 'info'
-app.config['MAIL_SERVER'] = 'smtp.googlemail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = str(os.environ.get('EMAIL_USER'))
-app.config['MAIL_PASSWORD'] = str(os.environ.get('EMAIL_PASS'))
-app.config['MAIL_DEFAULT_SENDER'] = str(os.environ.get('EMAIL_USER'))
-mail = Mail(app)
-
-from blog.users.routes import users
-from blog.posts.routes import posts
-from blog.main.routes import main
-from blog.errors.handlers import errors
-
-app.register_blueprint(users)
-app.register_blueprint(posts)
-app.register_blueprint(main)
-app.register_blueprint(errors)
+mail = Mail()
+
+
+def create_app(config_class=Config):
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    if app.config['UPLOAD_FOLDER'] is None:
+        app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
+    if app.config['AVATAR_FOLDER'] is None:
+        app.config['AVATAR_FOLDER'] = os.path.join(app.instance_path, 'avatars')
+    if app.config['FRAGMENT_CACHE_DIR'] is None:
+        app.config['FRAGMENT_CACHE_DIR'] = os.path.join(app.instance_path, 'fragment_cache')
+    if app.config['PROFILE_DIR'] is None:
+        app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')
+    if app.config['RATE_LIMIT_DB'] is None:
+        app.config['RATE_LIMIT_DB'] = os.path.join(app.instance_path, 'ratelimit.db')
+
+    configure_binds(app)
+    db.init_app(app)
+    configure_engines(app, db)
+    migrate.init_app(app, db, render_as_batch=True)
+    login_manager.init_app(app)
+    mail.init_app(app)
+
+    from blog.users.routes import users
+    from blog.posts.routes import posts
+    from blog.main.routes import main
+    from blog.errors.handlers import errors
+    from blog.api.routes import api
+    from blog.commands import commands
+
+    app.register_blueprint(users)
+    app.register_blueprint(posts)
+    app.register_blueprint(main)
+    app.register_blueprint(errors)
+    app.register_blueprint(api)
+    app.register_blueprint(commands)
+
+    from blog.cache import fragment_cache
+    from blog.instrumentation import instrumentation
+    from blog.limits import limiter
+    from blog.page_cache import page_cache
+    from blog.pagination import approximate_counts
+    from blog.posts.search import search_engine
+    from blog.rankings import rankings
+    from blog.posts.suggest import suggestions
+    from blog.users.activity import activity
+    from blog.users.passwords import passwords
+    from blog.users.session import session_users
+
+    instrumentation.init_app(app)
+    limiter.init_app(app)
+    fragment_cache.init_app(app)
+    page_cache.init_app(app)
+    approximate_counts.init_app(app)
+    search_engine.init_app(app)
+    suggestions.init_app(app)
+    rankings.init_app(app)
+    activity.init_app(app)
+    passwords.init_app(app)
+    session_users.init_app(app)
+
+    return app
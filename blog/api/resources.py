@@ -0,0 +1,111 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, select, tuple_
+from blog.models import User, Post, Category, Comment
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Resource:
+    def __init__(self, model, fields, defaults, order, filters=(), descending=True):
+        self.model = model
+        self.fields = fields
+        self.defaults = defaults
+        self.order = order
+        self.filters = filters
+        self.descending = descending
+
+    def columns(self, fields=None):
+        if not fields:
+            return list(self.defaults)
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(unknown)}')
+        return list(dict.fromkeys(names))
+
+    def statement(self, names):
+        order_names = [column.key for column in self.order]
+        selected = list(dict.fromkeys(names + order_names))
+        return select(*[self.fields[name] for name in selected])
+
+    def filtered(self, statement, args):
+        for name in self.filters:
+            value = args.get(name)
+            if value is not None:
+                try:
+                    statement = statement.where(self.fields[name] == int(value))
+                except ValueError:
+                    raise ApiError(f'{name} must be an integer')
+        return statement
+
+    def ordered(self, statement, position=None):
+        if position is not None:
+            if self.descending:
+                statement = statement.where(tuple_(*self.order) < tuple_(*position))
+            else:
+                statement = statement.where(tuple_(*self.order) > tuple_(*position))
+        return statement.order_by(*[column.desc() if self.descending else column.asc() for column in self.order])
+
+    def encode_cursor(self, row):
+        values = [getattr(row, column.key) for column in self.order]
+        payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values],
+                             separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            if len(values) != len(self.order):
+                raise ValueError(token)
+            return [datetime.fromisoformat(value) if isinstance(column.type, DateTime) else int(value)
+                    for column, value in zip(self.order, values)]
+        except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+            raise ApiError('Invalid cursor')
+
+    def serialize(self, row, names):
+        item = {}
+        for name in names:
+            value = getattr(row, name)
+            item[name] = value.isoformat() if isinstance(value, datetime) else value
+        return item
+
+
+RESOURCES = {
+    'posts': Resource(
+        Post,
+        fields={'id': Post.id, 'title': Post.title, 'content': Post.content, 'excerpt': Post.excerpt,
+                'date_posted': Post.date_posted, 'updated_at': Post.updated_at, 'user_id': Post.user_id,
+                'category_id': Post.category_id, 'comment_count': Post.comment_count},
+        defaults=('id', 'title', 'excerpt', 'date_posted', 'user_id', 'category_id', 'comment_count'),
+        order=(Post.date_posted, Post.id),
+        filters=('user_id', 'category_id')),
+    'comments': Resource(
+        Comment,
+        fields={'id': Comment.id, 'text': Comment.text, 'date_posted': Comment.date_posted,
+                'updated_at': Comment.updated_at, 'author_id': Comment.author_id, 'post_id': Comment.post_id},
+        defaults=('id', 'text', 'date_posted', 'author_id', 'post_id'),
+        order=(Comment.date_posted, Comment.id),
+        filters=('post_id', 'author_id')),
+    'categories': Resource(
+        Category,
+        fields={'id': Category.id, 'name': Category.name, 'post_count': Category.post_count},
+        defaults=('id', 'name', 'post_count'),
+        order=(Category.id,),
+        descending=False),
+    'users': Resource(
+        User,
+        fields={'id': User.id, 'username': User.username, 'image_file': User.image_file,
+                'post_count': User.post_count, 'comment_count': User.comment_count,
+                'last_activity': User.last_activity},
+        defaults=('id', 'username', 'image_file', 'post_count', 'comment_count'),
+        order=(User.id,),
+        descending=False),
+}
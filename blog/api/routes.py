@@ -0,0 +1,100 @@
+import json
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from blog import db
+from blog.api.resources import RESOURCES, ApiError
+from blog.database import read_only
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+NDJSON = 'application/x-ndjson'
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+    return jsonify(error=error.message), error.status
+
+
+def _resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(f'Unknown resource: {name}', 404)
+    return resource
+
+
+def _limit():
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def _ids():
+    try:
+        ids = [int(value) for value in request.args['ids'].split(',') if value.strip()]
+    except ValueError:
+        raise ApiError('ids must be a comma separated list of integers')
+    if len(ids) > current_app.config['API_MAX_BATCH']:
+        raise ApiError(f'At most {current_app.config["API_MAX_BATCH"]} ids per request')
+    return list(dict.fromkeys(ids))
+
+
+def _wants_ndjson():
+    return request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == NDJSON
+
+
+def _batch(resource, names):
+    ids = _ids()
+    statement = resource.statement(names).where(resource.model.id.in_(ids))
+    found = {row.id: row for row in db.session.execute(statement)}
+    return jsonify(data=[resource.serialize(found[item_id], names) for item_id in ids if item_id in found],
+                   missing=[item_id for item_id in ids if item_id not in found])
+
+
+def _stream(resource, names, statement):
+    def generate():
+        rows = db.session.execute(statement.execution_options(yield_per=current_app.config['API_STREAM_BATCH']))
+        for row in rows:
+            yield json.dumps(resource.serialize(row, names), separators=(',', ':')) + '\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def _list(resource, names, args):
+    statement = resource.filtered(resource.statement(names), args)
+    cursor = request.args.get('cursor')
+    position = resource.decode_cursor(cursor) if cursor else None
+    statement = resource.ordered(statement, position)
+    if _wants_ndjson():
+        if 'limit' in request.args:
+            statement = statement.limit(_limit())
+        return _stream(resource, names, statement)
+    limit = _limit()
+    rows = db.session.execute(statement.limit(limit + 1)).all()
+    next_cursor = resource.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return jsonify(data=[resource.serialize(row, names) for row in rows[:limit]], next_cursor=next_cursor)
+
+
+@api.route('/<name>')
+@read_only
+def collection(name):
+    resource = _resource(name)
+    names = resource.columns(request.args.get('fields'))
+    if 'ids' in request.args:
+        return _batch(resource, names)
+    return _list(resource, names, request.args)
+
+
+@api.route('/<name>/<int:item_id>')
+@read_only
+def item(name, item_id):
+    resource = _resource(name)
+    names = resource.columns(request.args.get('fields') or ','.join(resource.fields))
+    row = db.session.execute(resource.statement(names).where(resource.model.id == item_id)).first()
+    if row is None:
+        raise ApiError(f'No {name} record with id {item_id}', 404)
+    return jsonify(data=resource.serialize(row, names))
+
+
+@api.route('/posts/<int:post_id>/comments')
+@read_only
+def post_comments(post_id):
+    resource = RESOURCES['comments']
+    names = resource.columns(request.args.get('fields'))
+    return _list(resource, names, dict(request.args, post_id=post_id))
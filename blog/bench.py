@@ -0,0 +1,1008 @@
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+from PIL import Image
+from sqlalchemy import String, event, func, insert, select, update
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.serving import make_server
+from blog import db, counters, transfer
+from blog.cache import fragment_cache
+from blog.database import READER
+from blog.instrumentation import percentile
+from blog.loading import PROFILES
+from blog.models import User, Post, Category, Comment
+from blog.page_cache import page_cache
+from blog.pagination import approximate_counts, encode_cursor, keyset_paginate
+from blog.posts.search import search_engine
+from blog.posts.suggest import MAX_WORD_STARTS, SuggestionIndex, suggestions
+from blog.rankings import _comment_created, rankings
+from blog.users.activity import activity
+from blog.users.avatars import AvatarError, filename, process_upload
+from blog.users.passwords import passwords
+from blog.users.session import load_user, session_users
+
+
+WORDS = ('flask python sqlite query index cache latency cursor template session request response '
+         'worker thread process commit rollback engine pool column table migration blueprint route '
+         'signal event buffer queue token search excerpt avatar comment category feed profile').split()
+BENCH_EMAIL = 'bench@example.com'
+BENCH_PASSWORD = 'bench-password'
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+BENCH_OVERRIDES = {'WTF_CSRF_ENABLED': False, 'MAIL_SUPPRESS_SEND': True, 'RATE_LIMIT_ENABLED': False}
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _skewed(rng, size, skew):
+    return int(size * rng.random() ** skew)
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _insert(model, rows, batch_size, report):
+    total = 0
+    for batch in _batched(rows, batch_size):
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        total += len(batch)
+        report(model.__tablename__, total)
+    return total
+
+
+def seed(users=1000, categories=10, posts=10000, comments=50000, skew=2.0, days=365,
+         batch_size=5000, random_seed=None, report=lambda table, total: None):
+    rng = random.Random(random_seed)
+    now = datetime.now()
+    span = days * 24 * 3600
+    password = passwords.hash(BENCH_PASSWORD)
+
+    first = _next_id(User)
+    inserted = {'user': _insert(User, ({
+        'id': first + i,
+        'username': f'user{first + i}',
+        'email': f'user{first + i}@example.com',
+        'password': password,
+        'image_file': 'default.jpg',
+        'last_activity': now - timedelta(seconds=rng.randrange(span)),
+    } for i in range(users)), batch_size, report)}
+
+    first = _next_id(Category)
+    inserted['category'] = _insert(Category, ({'id': first + i, 'name': f'Category {first + i}'}
+                                              for i in range(categories)), batch_size, report)
+
+    user_ids = db.session.execute(select(User.id)).scalars().all()
+    category_ids = db.session.execute(select(Category.id)).scalars().all()
+    if posts and not (user_ids and category_ids):
+        raise ValueError('Posts need at least one user and one category.')
+
+    first = _next_id(Post)
+    post_dates = []
+
+    def post_rows():
+        for i in range(posts):
+            posted = now - timedelta(seconds=rng.randrange(span))
+            post_dates.append((first + i, posted))
+            content = _sentence(rng, 40, 200)
+            yield {
+                'id': first + i,
+                'title': _sentence(rng, 3, 8).capitalize(),
+                'content': content,
+                'excerpt': Post.make_excerpt(content),
+                'user_id': user_ids[_skewed(rng, len(user_ids), skew)],
+                'category_id': category_ids[_skewed(rng, len(category_ids), skew)],
+                'date_posted': posted,
+                'updated_at': posted,
+            }
+    inserted['post'] = _insert(Post, post_rows(), batch_size, report)
+
+    if comments and not post_dates:
+        post_dates = db.session.execute(select(Post.id, Post.date_posted)).all()
+    if comments and not post_dates:
+        raise ValueError('Comments need at least one post.')
+    rng.shuffle(post_dates)
+    first = _next_id(Comment)
+
+    def comment_rows():
+        for i in range(comments):
+            post_id, posted = post_dates[_skewed(rng, len(post_dates), skew)]
+            commented = posted + timedelta(seconds=rng.randrange(max(1, int((now - posted).total_seconds()))))
+            yield {
+                'id': first + i,
+                'text': _sentence(rng, 3, 25)[:200],
+                'author_id': user_ids[_skewed(rng, len(user_ids), skew)],
+                'post_id': post_id,
+                'date_posted': commented,
+                'updated_at': commented,
+            }
+    inserted['comment'] = _insert(Comment, comment_rows(), batch_size, report)
+
+    counters.reconcile(fix=True)
+    inserted['search_index'] = search_engine.rebuild()
+    inserted['post_score'] = rankings.rebuild()
+    return inserted
+
+
+def bench_config(config, **overrides):
+    values = {key: value for key, value in config.items() if key.isupper()}
+    # The reader bind was derived from the source app's URI; let create_app derive it again from ours.
+    values['SQLALCHEMY_BINDS'] = {key: value for key, value in (values.get('SQLALCHEMY_BINDS') or {}).items()
+                                  if key != READER}
+    values.update(BENCH_OVERRIDES, **overrides)
+    return type('BenchConfig', (), values)
+
+
+class Fixture:
+    def __init__(self, app):
+        self.app = app
+        self._sequence = itertools.count()
+        self._lock = Lock()
+        with app.app_context():
+            user = User.query.filter_by(email=BENCH_EMAIL).first()
+            if user is None:
+                user = User(username='bench', email=BENCH_EMAIL, password=passwords.hash(BENCH_PASSWORD))
+                db.session.add(user)
+                db.session.commit()
+            self.user_id = user.id
+            self.username = user.username
+            busiest = db.session.execute(select(Post.id, Post.category_id)
+                                         .order_by(Post.comment_count.desc()).limit(1)).first()
+            if busiest is None:
+                raise ValueError('The database has no posts; run flask seed first.')
+            self.post_id, self.category_id = busiest
+            self.category_name = db.session.get(Category, self.category_id).name
+            suggestions.rebuild()
+            self.token = user.get_reset_token()
+            self.own_post_id = self.new_post()
+            self.avatar = self._avatar(user)
+
+    def _avatar(self, user):
+        folder = self.app.config['UPLOAD_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, 'bench-avatar.png')
+        Image.new('RGB', (512, 512), (32, 96, 160)).save(path)
+        name = process_upload(path)
+        os.remove(path)
+        if user.image_file != name:
+            user.image_file = name
+            db.session.commit()
+        return filename(name, 125, 'jpeg')
+
+    def sequence(self):
+        with self._lock:
+            return next(self._sequence)
+
+    def new_post(self):
+        with self.app.app_context():
+            content = _sentence(random, 40, 80)
+            post = Post(title=f'Bench post {self.sequence()}', content=content, excerpt=Post.make_excerpt(content),
+                        user_id=self.user_id, category_id=self.category_id)
+            db.session.add(post)
+            db.session.flush()
+            counters.post_created(post)
+            db.session.commit()
+            return post.id
+
+    def new_comment(self):
+        with self.app.app_context():
+            comment = Comment(text='Bench comment', author_id=self.user_id, post_id=self.own_post_id)
+            db.session.add(comment)
+            counters.comment_created(comment)
+            db.session.commit()
+            return comment.id
+
+    def login(self, client):
+        client.post('/login', data={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+
+    def logout(self, client):
+        client.get('/logout')
+
+
+class Target:
+    def __init__(self, endpoint, method, prepare, auth=None, write=False, effect=None, variant=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.variant = variant
+        self.prepare = prepare
+        self.auth = auth
+        self.write = write
+        self.effect = effect
+
+    @property
+    def key(self):
+        if self.variant:
+            return f'{self.endpoint} {self.method} {self.variant}'
+        return f'{self.endpoint} {self.method}'
+
+
+def _post_form(f):
+    return {'title': f'Bench post {f.sequence()}', 'content': _sentence(random, 40, 80), 'category': f.category_name}
+
+
+TARGETS = [
+    Target('posts.home', 'GET', lambda f: ('/', {})),
+    Target('posts.category', 'GET', lambda f: (f'/category/{f.category_id}/', {})),
+    Target('posts.post', 'GET', lambda f: (f'/post/{f.post_id}', {})),
+    Target('posts.comments', 'GET', lambda f: (f'/post/{f.post_id}/comments', {})),
+    Target('posts.search', 'GET', lambda f: ('/search', {'query_string': {'q': random.choice(WORDS)}})),
+    Target('posts.search', 'POST', lambda f: ('/search', {'data': {'searched': random.choice(WORDS)}})),
+    Target('posts.suggest', 'GET', lambda f: ('/suggest', {'query_string': {
+        'q': random.choice(WORDS)[:random.randint(1, 5)]}})),
+    Target('posts.create_post', 'GET', lambda f: ('/create_post', {}), auth=True),
+    Target('posts.create_post', 'POST', lambda f: ('/create_post', {'data': _post_form(f)}), auth=True, write=True),
+    Target('posts.update_post', 'GET', lambda f: (f'/post/{f.own_post_id}/update', {}), auth=True),
+    Target('posts.update_post', 'POST', lambda f: (f'/post/{f.own_post_id}/update', {'data': _post_form(f)}),
+           auth=True, write=True),
+    Target('posts.delete_post', 'POST', lambda f: (f'/post/{f.new_post()}/delete', {}), auth=True, write=True),
+    Target('posts.create_comment', 'POST', lambda f: (f'/create_comment/{f.own_post_id}/',
+                                                      {'data': {'text': _sentence(random, 3, 12)}}),
+           auth=True, write=True),
+    Target('posts.delete_comment', 'POST', lambda f: (f'/delete_comment/{f.new_comment()}/', {}),
+           auth=True, write=True),
+    Target('users.register', 'GET', lambda f: ('/register', {})),
+    Target('users.register', 'POST', lambda f: ('/register', {'data': _register_form(f)}), write=True),
+    Target('users.login', 'GET', lambda f: ('/login', {})),
+    Target('users.login', 'POST', lambda f: ('/login', {'data': {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}}),
+           effect='login'),
+    Target('users.logout', 'GET', lambda f: ('/logout', {}), auth=True, effect='logout'),
+    Target('users.account', 'GET', lambda f: (f'/account/{f.user_id}', {})),
+    Target('users.avatar', 'GET', lambda f: (f'/avatars/{f.avatar}', {})),
+    Target('users.update_activity', 'POST', lambda f: ('/update_activity',
+                                                       {'json': {'last_activity': int(time.time() * 1000)}}),
+           auth=True, write=True),
+    Target('users.update_account', 'GET', lambda f: ('/update_account', {}), auth=True),
+    Target('users.update_account', 'POST', lambda f: ('/update_account', {'data': {
+        'username': f.username, 'email': BENCH_EMAIL}}), auth=True, write=True),
+    Target('users.reset_request', 'GET', lambda f: ('/reset_password', {}), auth=False),
+    Target('users.reset_request', 'POST', lambda f: ('/reset_password', {'data': {'email': BENCH_EMAIL}}),
+           auth=False, write=True),
+    Target('users.reset_token', 'GET', lambda f: (f'/reset_request/{f.token}/', {}), auth=False),
+    Target('users.reset_token', 'POST', lambda f: (f'/reset_request/{f.token}/', {'data': {
+        'password': BENCH_PASSWORD, 'confirm_password': BENCH_PASSWORD}}), auth=False, write=True),
+    Target('main.about', 'GET', lambda f: ('/about', {})),
+    Target('api.collection', 'GET', lambda f: ('/api/v1/posts', {})),
+    Target('api.collection', 'GET', lambda f: ('/api/v1/posts', {'query_string': {
+        'ids': ','.join(str(f.post_id - i) for i in range(10)), 'fields': 'id,title'}}), variant='ids'),
+    Target('api.collection', 'GET', lambda f: ('/api/v1/comments', {'query_string': {
+        'post_id': f.post_id, 'format': 'ndjson'}}), variant='ndjson'),
+    Target('api.item', 'GET', lambda f: (f'/api/v1/posts/{f.post_id}', {})),
+    Target('api.post_comments', 'GET', lambda f: (f'/api/v1/posts/{f.post_id}/comments', {})),
+]
+
+
+def _register_form(f):
+    name = f'b{os.getpid() % 10000}x{f.sequence()}'
+    return {'username': name, 'email': f'{name}@example.com', 'password': 'pw', 'confirm_password': 'pw'}
+
+
+def select_targets(mix='all', only=()):
+    targets = [target for target in TARGETS
+               if (mix == 'all' or (mix == 'write') == target.write)
+               and (not only or target.endpoint in only or target.key in only)]
+    if not targets:
+        raise ValueError('No benchmark targets match the selection.')
+    return targets
+
+
+def uncovered_endpoints(app):
+    covered = {target.endpoint for target in TARGETS}
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules()
+                   if rule.endpoint.split('.')[0] in ('posts', 'users', 'api')} - covered)
+
+
+def _queries(response):
+    match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def _drive(app, fixture, schedule):
+    client = app.test_client()
+    logged_in = False
+    samples = []
+    for target in schedule:
+        if target.auth is True and not logged_in:
+            fixture.login(client)
+            logged_in = True
+        elif target.auth is False and logged_in:
+            fixture.logout(client)
+            logged_in = False
+        path, options = target.prepare(fixture)
+        started = time.perf_counter()
+        response = client.open(path, method=target.method, **options)
+        size = len(response.get_data())
+        elapsed = time.perf_counter() - started
+        samples.append((target.key, elapsed, response.status_code, _queries(response), size))
+        response.close()
+        if target.effect == 'login':
+            logged_in = True
+        elif target.effect == 'logout':
+            logged_in = False
+    return samples
+
+
+def _run_threads(app, fixture, schedules):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(schedules)) as executor:
+        results = list(executor.map(lambda schedule: _drive(app, fixture, schedule), schedules))
+    return [sample for samples in results for sample in samples], time.perf_counter() - started
+
+
+def _split(count, parts):
+    return [count // parts + (1 if i < count % parts else 0) for i in range(parts)]
+
+
+def _summarize(samples, wall):
+    latencies = [sample[1] * 1000 for sample in samples]
+    queries = [sample[3] for sample in samples if sample[3] is not None]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample[2])] = statuses.get(str(sample[2]), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[2] >= 500),
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'bytes_mean': round(sum(sample[4] for sample in samples) / len(samples)),
+    }
+
+
+def _group(samples):
+    grouped = {}
+    for sample in samples:
+        grouped.setdefault(sample[0], []).append(sample)
+    return grouped
+
+
+def run_sequential(app, targets, requests, concurrency):
+    fixture = Fixture(app)
+    endpoints = {}
+    for target in targets:
+        _drive(app, fixture, [target])
+        samples, wall = _run_threads(app, fixture, [[target] * n for n in _split(requests, concurrency) if n])
+        endpoints[target.key] = _summarize(samples, wall)
+    return endpoints
+
+
+def _mixed_schedules(targets, requests, concurrency, random_seed):
+    rng = random.Random(random_seed)
+    return [[rng.choice(targets) for _ in range(n)] for n in _split(requests, concurrency) if n]
+
+
+def run_mixed(app, targets, requests, concurrency, random_seed=None):
+    fixture = Fixture(app)
+    samples, wall = _run_threads(app, fixture, _mixed_schedules(targets, requests, concurrency, random_seed))
+    return samples, wall
+
+
+def _process_main(config, keys, requests, concurrency, random_seed):
+    from blog import create_app
+    app = create_app(bench_config(config))
+    targets = [target for target in TARGETS if target.key in keys]
+    try:
+        return run_mixed(app, targets, requests, concurrency, random_seed)
+    finally:
+        activity.close()
+        passwords.shutdown()
+
+
+def run_processes(app, targets, requests, concurrency, processes, random_seed=None):
+    Fixture(app)
+    keys = [target.key for target in targets]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_process_main, dict(app.config), keys, n, concurrency,
+                                   None if random_seed is None else random_seed + i)
+                   for i, n in enumerate(_split(requests, processes)) if n]
+        results = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+    return [sample for samples, _ in results for sample in samples], wall
+
+
+def run(app, mix='all', only=(), requests=200, concurrency=4, processes=1, mode='sequential', random_seed=None):
+    targets = select_targets(mix, only)
+    meta = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'mode': 'mixed' if processes > 1 else mode,
+        'mix': mix,
+        'requests': requests,
+        'concurrency': concurrency,
+        'processes': processes,
+    }
+    with app.app_context():
+        meta['rows'] = {model.__tablename__: db.session.execute(select(func.count()).select_from(model)).scalar()
+                        for model in (User, Category, Post, Comment)}
+    if processes > 1:
+        samples, wall = run_processes(app, targets, requests, concurrency, processes, random_seed)
+    elif mode == 'mixed':
+        samples, wall = run_mixed(app, targets, requests, concurrency, random_seed)
+    else:
+        return {'meta': meta, 'endpoints': run_sequential(app, targets, requests, concurrency)}
+    endpoints = {key: _summarize(group, wall) for key, group in sorted(_group(samples).items())}
+    return {'meta': meta, 'total': _summarize(samples, wall), 'endpoints': endpoints}
+
+
+COLD_START_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import blog
+imported = time.perf_counter()
+app = blog.create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+responded = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (responded - created) * 1000, 'status': response.status_code}))
+'''
+
+
+def cold_start(path='/', runs=5, cwd=None):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, path], cwd=cwd, check=True,
+                                capture_output=True, text=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample['process_ms'] = (time.perf_counter() - started) * 1000
+        samples.append(sample)
+    report = {'runs': runs, 'path': path, 'statuses': sorted({sample['status'] for sample in samples})}
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms'):
+        values = [sample[key] for sample in samples]
+        report[key] = {'p50': round(percentile(values, 0.50), 2), 'max': round(max(values), 2)}
+    return report
+
+
+def compare(baseline, current, threshold=10.0):
+    rows = []
+    for key in sorted(set(baseline['endpoints']) & set(current['endpoints'])):
+        old, new = baseline['endpoints'][key], current['endpoints'][key]
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        queries = None
+        if old.get('queries_mean') is not None and new.get('queries_mean') is not None:
+            queries = round(new['queries_mean'] - old['queries_mean'], 2)
+        regressed = change > threshold or (queries is not None and queries > 0) or new['errors'] > old['errors']
+        rows.append({'endpoint': key, 'p95_old_ms': old['p95_ms'], 'p95_new_ms': new['p95_ms'],
+                     'p95_change_pct': round(change, 1), 'queries_change': queries,
+                     'throughput_old_rps': old['throughput_rps'], 'throughput_new_rps': new['throughput_rps'],
+                     'regressed': regressed})
+    return rows
+
+
+SCENARIOS = {}
+
+
+def scenario(name, sizes):
+    def decorator(function):
+        SCENARIOS[name] = (function, sizes)
+        return function
+    return decorator
+
+
+def _latency(samples):
+    latencies = sorted(sample * 1000 for sample in samples)
+    return {'runs': len(latencies), 'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3), 'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(latencies[-1], 3)}
+
+
+def _timed(function, arguments):
+    samples = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - started)
+    return _latency(samples)
+
+
+def scratch_app(config, directory, name, **overrides):
+    from blog import create_app
+    path = os.path.join(directory, f'{name}.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    app = create_app(bench_config(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', PAGE_CACHE_WARM_PAGES=0,
+                                  SUGGEST_BUILD_ON_START=False, **overrides))
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
+
+
+def run_scenario(app, name, directory, sizes=()):
+    function, default_sizes = SCENARIOS[name]
+    meta = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'scenario': name,
+        'sizes': list(sizes or default_sizes),
+    }
+    return {'meta': meta, 'results': function(dict(app.config), directory, sizes or default_sizes)}
+
+
+@scenario('search', sizes=(10000, 100000, 1000000))
+def search_scenario(config, directory, sizes, queries=20):
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'search-{size}', SEARCH_BACKEND='fts5')
+        with app.app_context():
+            seed(users=100, categories=10, posts=size, comments=0, random_seed=size)
+            db.session.execute(update(Post).where(Post.id % 1000 == 0)
+                               .values(content=Post.content + ' benchrare' + func.cast(Post.id % 10, String)))
+            db.session.commit()
+            search_engine.rebuild()
+            rng = random.Random(size)
+            terms = {'common': rng.choices(WORDS, k=queries),
+                     'rare': [f'benchrare{rng.randrange(10)}' for _ in range(queries)]}
+            like = lambda term: Post.query.filter(Post.content.like(f'%{term}%')).order_by(Post.title)
+            results[size] = {kind: {
+                'fts5_page': _timed(lambda term: search_engine.search(term, per_page=10), chosen),
+                'like_page': _timed(lambda term: like(term).limit(10).all(), chosen),
+                'like_all': _timed(lambda term: like(term).all(), chosen[:5]),
+            } for kind, chosen in terms.items()}
+    return results
+
+def _serve(app):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+_opener = build_opener(_NoRedirect)
+
+
+def _fetch(url, data=None, headers=None):
+    started = time.perf_counter()
+    try:
+        with _opener.open(Request(url, data=data, headers=headers or {})) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    return status, time.perf_counter() - started
+
+
+def _load_process(base, requests, duration):
+    stop = Event()
+    lock = Lock()
+    statuses, samples = {}, []
+
+    def client(path, data=None, headers=None):
+        while not stop.is_set():
+            status, elapsed = _fetch(base + path, data, headers)
+            with lock:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                samples.append(elapsed)
+
+    threads = [Thread(target=client, args=request) for request in requests]
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {'statuses': statuses, 'throughput_rps': round(len(samples) / duration, 1), 'latency': _latency(samples)}
+
+
+def _under_load(app, requests, duration, probe=('/',), warmup=20):
+    server, base = _serve(app)
+    path, *request = probe
+    try:
+        for _ in range(warmup):
+            _fetch(base + path, *request)
+        idle = [_fetch(base + path, *request)[1] for _ in range(warmup * 10)]
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            load = executor.submit(_load_process, base, requests, duration)
+            loaded = []
+            while not load.done():
+                loaded.append(_fetch(base + path, *request)[1])
+            return {'probe': path, 'idle': _latency(idle), 'loaded': _latency(loaded), 'load': load.result()}
+    finally:
+        server.shutdown()
+
+
+@scenario('login-storm', sizes=(4, 16, 64))
+def login_storm_scenario(config, directory, sizes, duration=10):
+    results = {}
+    for limited in (False, True):
+        app = scratch_app(config, directory, 'login-storm', RATE_LIMIT_ENABLED=limited, PAGE_CACHE=False,
+                          BCRYPT_LOG_ROUNDS=12)
+        with app.app_context():
+            seed(users=100, categories=10, posts=2000, comments=5000, random_seed=1)
+            Fixture(app)
+        credentials = urlencode({'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}).encode()
+        for size in sizes:
+            results[f'{"limited" if limited else "unlimited"} {size} clients'] = \
+                _under_load(app, [('/login', credentials)] * size, duration)
+    passwords.shutdown()
+    return results
+
+
+@scenario('flood', sizes=(12, 48))
+def flood_scenario(config, directory, sizes, duration=10):
+    results = {}
+    for limited in (False, True):
+        app = scratch_app(config, directory, 'flood', RATE_LIMIT_ENABLED=limited, PAGE_CACHE=False,
+                          BCRYPT_LOG_ROUNDS=12)
+        with app.app_context():
+            seed(users=100, categories=10, posts=2000, comments=5000, random_seed=1)
+            Fixture(app)
+            search_engine.rebuild()
+        for size in sizes:
+            requests = [(f'/search?q={random.choice(WORDS)}',) for _ in range(size - size // 3)]
+            wrong = urlencode({'email': BENCH_EMAIL, 'password': 'wrong-password'}).encode()
+            requests += [('/login', wrong)] * (size // 3)
+            results[f'{"limited" if limited else "unlimited"} {size} clients'] = _under_load(app, requests, duration)
+    passwords.shutdown()
+    return results
+
+
+@scenario('session-user', sizes=(10, 1000, 50000))
+def session_user_scenario(config, directory, sizes, runs=20):
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'session-user-{size}', PAGE_CACHE=False)
+        with app.app_context():
+            seed(users=1, categories=2, posts=size, comments=0, random_seed=size)
+            user_id = db.session.execute(select(User.id)).scalar()
+
+            # The loader this replaced: User.query.get() with posts and comments joined eagerly.
+            def joined(user_id):
+                db.session.expunge_all()
+                return db.session.get(User, user_id, options=[joinedload(User.posts), joinedload(User.comments)])
+
+            def uncached(user_id):
+                session_users.clear()
+                return load_user(user_id)
+
+            results[size] = {'joined_loader': _timed(joined, [user_id] * runs),
+                             'column_loader': _timed(uncached, [user_id] * runs),
+                             'cached_loader': _timed(load_user, [user_id] * runs)}
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        results[size]['authenticated_about'] = _timed(client.get, ['/about'] * runs)
+    return results
+
+
+@scenario('pagination', sizes=(50000,))
+def pagination_scenario(config, directory, sizes, pages=(1, 100, 10000), per_page=3, runs=20):
+    order = (Post.date_posted, Post.id)
+    newest = lambda: Post.query.order_by(Post.date_posted.desc(), Post.id.desc())
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'pagination-{size}', PAGE_CACHE=False)
+        client = app.test_client()
+        results[size] = {}
+        with app.app_context():
+            seed(users=100, categories=10, posts=size, comments=0, random_seed=size)
+            cursors = {1: None}
+            for page in pages[1:]:
+                last = newest().with_entities(Post.date_posted, Post.id).offset((page - 1) * per_page - 1).first()
+                if last is not None:
+                    cursors[page] = encode_cursor('next', page, *last)
+        for page, cursor in cursors.items():
+            with app.app_context():
+                approximate_counts.clear()
+                results[size][page] = {
+                    'offset_paginate': _timed(lambda page: newest().paginate(page=page, per_page=per_page),
+                                              [page] * runs),
+                    'keyset_paginate': _timed(lambda cursor: keyset_paginate(Post.query, order, cursor, per_page,
+                                                                             count_key=('home',)), [cursor] * runs),
+                }
+            results[size][page]['home_route'] = _timed(client.get, [f'/?cursor={cursor}' if cursor else '/'] * runs)
+    return results
+
+
+def _session_cookie(app, user_id):
+    value = app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+    return {'Cookie': f'{app.config["SESSION_COOKIE_NAME"]}={value}'}
+
+
+@scenario('heartbeats', sizes=(100, 1000))
+def heartbeat_scenario(config, directory, sizes, duration=10):
+    app = scratch_app(config, directory, 'heartbeats', PAGE_CACHE=False)
+    with app.app_context():
+        seed(users=max(sizes) + 1, categories=10, posts=1000, comments=0, random_seed=1)
+        user_ids = db.session.execute(select(User.id).order_by(User.id)).scalars().all()
+        post_id = db.session.execute(select(Post.id)).scalar()
+    beat = json.dumps({'last_activity': int(time.time() * 1000)}).encode()
+    comment = ('/create_comment/%d/' % post_id, urlencode({'text': 'Still here'}).encode(),
+               _session_cookie(app, user_ids[0]))
+    results = {}
+    for size in sizes:
+        requests = [('/update_activity', beat, dict(_session_cookie(app, user_id), **{
+            'Content-Type': 'application/json'})) for user_id in user_ids[1:size + 1]]
+        results[f'{size} clients'] = _under_load(app, requests, duration, probe=comment)
+    activity.flush()
+    return results
+
+
+def _peak_rss_mb():
+    # VmHWM starts over at exec, unlike ru_maxrss, which keeps the spawning parent's peak (Linux only).
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return round(int(line.split()[1]) / 1024, 1)
+
+
+def _isolated(function, *args):
+    # A fresh process per measurement, so its peak RSS covers that work alone.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(function, *args).result()
+
+
+def _avatar_process(config, path, runs):
+    from blog import create_app
+    app = create_app(bench_config(config))
+    baseline = _peak_rss_mb()
+    samples, rejected = [], None
+    with app.app_context():
+        for _ in range(runs):
+            shutil.rmtree(app.config['AVATAR_FOLDER'], ignore_errors=True)
+            started = time.perf_counter()
+            try:
+                process_upload(path)
+            except AvatarError as error:
+                rejected = str(error)
+            samples.append(time.perf_counter() - started)
+    latency = _latency(samples)
+    return {'latency': latency, 'images_per_s': round(1000 / latency['p50_ms'], 2), 'rejected': rejected,
+            'baseline_rss_mb': baseline, 'peak_rss_mb': _peak_rss_mb()}
+
+
+@scenario('avatars', sizes=(1000, 4000, 4800, 6000))
+def avatar_scenario(config, directory, sizes, formats=('JPEG', 'PNG'), runs=5):
+    config = dict(config, SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(directory, "avatars.db")}',
+                  AVATAR_FOLDER=os.path.join(directory, 'avatars'))
+    results = {}
+    for size in sizes:
+        noise = Image.merge('RGB', [Image.effect_noise((size, size), 64) for _ in range(3)])
+        for fmt in formats:
+            path = os.path.join(directory, f'upload-{size}.{fmt.lower()}')
+            noise.save(path, fmt)
+            result = _isolated(_avatar_process, config, path, runs)
+            results[f'{size}x{size} {fmt}'] = dict(result, upload_mb=round(os.path.getsize(path) / 2 ** 20, 1))
+            os.remove(path)
+        noise.close()
+    return results
+
+
+def _transfer_process(config, phase, directory, fmt, batch_size):
+    from blog import create_app
+    app = create_app(bench_config(config))
+    baseline = _peak_rss_mb()
+    with app.app_context():
+        started = time.perf_counter()
+        if phase == 'export':
+            rows = transfer.export_data(directory, fmt, batch_size=batch_size)
+        else:
+            rows = transfer.import_data(directory, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+    total = sum(rows.values())
+    return {'rows': total, 'seconds': round(elapsed, 1), 'rows_per_s': round(total / elapsed),
+            'baseline_rss_mb': baseline, 'peak_rss_mb': _peak_rss_mb()}
+
+
+@scenario('transfer', sizes=(1000000,))
+def transfer_scenario(config, directory, sizes, formats=transfer.FORMATS, batch_size=1000):
+    results = {}
+    for size in sizes:
+        source = scratch_app(config, directory, f'transfer-{size}')
+        with source.app_context():
+            seed(users=size // 100, categories=10, posts=size // 10, comments=size - size // 100 - size // 10 - 10,
+                 random_seed=size)
+        for fmt in formats:
+            export = os.path.join(directory, f'export-{size}-{fmt}')
+            target = scratch_app(config, directory, f'import-{size}-{fmt}')
+            results[f'{size} rows {fmt}'] = {
+                'export': _isolated(_transfer_process, dict(source.config), 'export', export, fmt, batch_size),
+                'import': _isolated(_transfer_process, dict(target.config), 'import', export, fmt, batch_size),
+                'export_mb': round(sum(entry.stat().st_size for entry in os.scandir(export)) / 2 ** 20, 1),
+            }
+            shutil.rmtree(export)
+    return results
+
+
+@scenario('rankings', sizes=(1000000,))
+def rankings_scenario(config, directory, sizes, runs=200):
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'rankings-{size}')
+        with app.app_context():
+            seed(users=size // 100, categories=10, posts=size // 10, comments=size - size // 100 - size // 10 - 10,
+                 random_seed=size)
+            rng = random.Random(size)
+            post_ids = db.session.execute(select(Post.id)).scalars().all()
+            user_ids = db.session.execute(select(User.id)).scalars().all()
+
+            def comment(_):
+                db.session.add(Comment(text='Ranked', author_id=rng.choice(user_ids), post_id=rng.choice(post_ids)))
+                db.session.commit()
+            event.remove(Comment, 'after_insert', _comment_created)
+            try:
+                without = _timed(comment, range(runs))
+            finally:
+                event.listen(Comment, 'after_insert', _comment_created)
+            results[size] = {
+                'comment_commit': {'listeners_off': without, 'listeners_on': _timed(comment, range(runs))},
+                'trending_load': _timed(lambda _: rankings.load_trending(), range(runs)),
+                'trending_cached': _timed(lambda _: rankings.trending(), range(runs)),
+                'active_load': _timed(lambda _: rankings.load_active(), range(runs)),
+                'active_cached': _timed(lambda _: rankings.active(), range(runs)),
+            }
+    return results
+
+
+@scenario('comments', sizes=(10000,))
+def comments_scenario(config, directory, sizes, runs=50):
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'comments-{size}', PAGE_CACHE=False)
+        with app.app_context():
+            seed(users=100, categories=10, posts=1000, comments=0, random_seed=size)
+            rng = random.Random(size)
+            user_ids = db.session.execute(select(User.id)).scalars().all()
+            now = datetime.now()
+            post = Post(title='Busy post', content=_sentence(rng, 40, 200), user_id=user_ids[0],
+                        category_id=db.session.execute(select(Category.id)).scalar(), date_posted=now)
+            post.excerpt = Post.make_excerpt(post.content)
+            db.session.add(post)
+            db.session.commit()
+            post_id, first = post.id, _next_id(Comment)
+            rows = ({'id': first + i, 'text': _sentence(rng, 3, 25)[:200], 'post_id': post_id,
+                     'author_id': rng.choice(user_ids), 'date_posted': now + timedelta(seconds=i),
+                     'updated_at': now + timedelta(seconds=i)} for i in range(size))
+            _insert(Comment, rows, 5000, lambda table, total: None)
+            counters.reconcile(fix=True)
+        client = app.test_client()
+        results[size] = {'feed_has_post': f'/post/{post_id}"'.encode() in client.get('/').data}
+        for label, path in (('comments_html', f'/post/{post_id}/comments'),
+                            ('comments_json', f'/post/{post_id}/comments?format=json'),
+                            ('post', f'/post/{post_id}'), ('feed', '/')):
+            lengths = []
+            latency = _timed(lambda path: lengths.append(len(client.get(path).data)), [path] * runs)
+            results[size][label] = dict(latency, bytes=max(lengths))
+    return results
+
+
+@scenario('suggest', sizes=(1000000,))
+def suggest_scenario(config, directory, sizes, lookups=1000):
+    results = {}
+    for size in sizes:
+        rng = random.Random(size)
+        titles = [_sentence(rng, 3, 8).capitalize() for _ in range(size)]
+        items = lambda: (('post', post_id, title) for post_id, title in enumerate(titles, 1))
+        index = SuggestionIndex(max_entries=size * MAX_WORD_STARTS, limit=config['SUGGEST_LIMIT'])
+        started = time.perf_counter()
+        index.load(items())
+        build = time.perf_counter() - started
+        del index
+        tracemalloc.start()
+        try:
+            index = SuggestionIndex(max_entries=size * MAX_WORD_STARTS, limit=config['SUGGEST_LIMIT'])
+            index.load(items())
+            traced = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        prefixes = [rng.choice(WORDS)[:rng.randint(1, 4)] for _ in range(lookups)]
+        phrases = [' '.join(rng.choice(titles).split()[:2]).lower() for _ in range(lookups)]
+        results[size] = {
+            'entries': len(index), 'labels': size, 'build_s': round(build, 1),
+            'traced_bytes': traced, 'bytes_per_entry': round(traced / len(index), 1),
+            'bytes_per_label': round(traced / size, 1),
+            'prefix_lookup': _timed(index.suggest, prefixes),
+            'phrase_lookup': _timed(index.suggest, phrases),
+        }
+    return results
+
+
+@scenario('page-cache', sizes=(10000,))
+def page_cache_scenario(config, directory, sizes, runs=100):
+    from blog import create_app
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'page-cache-{size}', PAGE_CACHE=False)
+        with app.app_context():
+            seed(users=100, categories=10, posts=size, comments=size * 5, random_seed=size)
+            post_id = db.session.execute(select(Post.id).order_by(Post.comment_count.desc())).scalar()
+            category_id = db.session.execute(select(Category.id)).scalar()
+        paths = {'home': '/', 'category': f'/category/{category_id}/', 'post': f'/post/{post_id}'}
+        results[size] = {}
+        for enabled in (False, True):
+            # Module-level singletons follow the latest create_app, so each setting gets its own app in turn.
+            app = create_app(bench_config(app.config, PAGE_CACHE=enabled))
+            with app.app_context():
+                fragment_cache.backend.clear()
+            client = app.test_client()
+            results[size][f'page_cache_{"on" if enabled else "off"}'] = dict(
+                {name: _timed(client.get, [path] * runs) for name, path in paths.items()}, **page_cache.stats())
+    return results
+
+
+def _column_bytes(instance):
+    columns = instance.__table__.columns.keys()
+    return sum(len(str(value).encode()) for key, value in vars(instance).items()
+               if key in columns and value is not None)
+
+
+@scenario('feed-profile', sizes=(10000,))
+def feed_profile_scenario(config, directory, sizes, pages=100, per_page=3, rounds=5):
+    order = (Post.date_posted, Post.id)
+    variants = {'content_deferred': PROFILES['feed'],
+                'content_loaded': lambda: [selectinload(Post.author), selectinload(Post.category)]}
+    results = {}
+    for size in sizes:
+        app = scratch_app(config, directory, f'feed-profile-{size}', PAGE_CACHE=False)
+        with app.app_context():
+            seed(users=100, categories=10, posts=size, comments=0, random_seed=size)
+        client = app.test_client()
+        loaded = {name: [] for name in variants}
+        samples = {name: {'query_and_hydration': [], 'home_route': []} for name in variants}
+        original = PROFILES['feed']
+        try:
+            # Rounds alternate the variants so warm-up and drift do not favour whichever runs first.
+            for _ in range(rounds):
+                for name, profile in variants.items():
+                    PROFILES['feed'] = profile
+                    with app.app_context():
+                        cursor = None
+                        for _ in range(pages):
+                            started = time.perf_counter()
+                            page = keyset_paginate(Post.query.options(*profile()), order, cursor, per_page)
+                            samples[name]['query_and_hydration'].append(time.perf_counter() - started)
+                            loaded[name].append(sum(_column_bytes(post) for post in page.items))
+                            db.session.expunge_all()
+                            cursor = page.next_cursor
+                    for _ in range(pages):
+                        started = time.perf_counter()
+                        client.get('/')
+                        samples[name]['home_route'].append(time.perf_counter() - started)
+        finally:
+            PROFILES['feed'] = original
+        results[size] = {name: dict({key: _latency(values) for key, values in samples[name].items()},
+                                    post_column_bytes_per_page=round(sum(loaded[name]) / len(loaded[name])))
+                         for name in variants}
+    return results
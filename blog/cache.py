@@ -0,0 +1,290 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from collections import OrderedDict
+from threading import Lock
+from flask import g, has_request_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from blog.events import after_commit
+from blog.models import User, Post, Category, Comment
+
+
+# Version tokens live alongside the fragments and are evicted with them. A version that
+# is missing is replaced by a fresh random one rather than a fixed default, so an evicted
+# version can never match fragments that were stored under an earlier one.
+VERSION_PREFIX = '\x00v:'
+
+
+def new_version():
+    return uuid.uuid4().hex[:12]
+
+
+class MemoryCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._versions = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(key) + len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._discard(key)
+        self._entries[key] = value
+        self.size += len(key) + len(value)
+        self._versions += key.startswith(VERSION_PREFIX)
+        while self.size > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self.size -= len(key) + len(value)
+            self._versions -= key.startswith(VERSION_PREFIX)
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions = 0
+            self.size = 0
+
+    def get_version(self, dependency):
+        key = VERSION_PREFIX + dependency
+        with self._lock:
+            version = self._entries.get(key)
+            if version is None:
+                version = new_version()
+                self._store(key, version)
+            else:
+                self._entries.move_to_end(key)
+            return version
+
+    def bump_version(self, dependency):
+        with self._lock:
+            self._store(VERSION_PREFIX + dependency, new_version())
+
+    def __len__(self):
+        return len(self._entries) - self._versions
+
+
+class FileSystemCache:
+    prune_every = 100
+
+    def __init__(self, directory, threshold=10000):
+        self.directory = directory
+        self.threshold = threshold
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, prefix, key):
+        return os.path.join(self.directory, prefix + hashlib.sha1(key.encode()).hexdigest())
+
+    def _read(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        return self._read(self._path('f-', key))
+
+    def set(self, key, value):
+        self._write(self._path('f-', key), value)
+        self._wrote()
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path('f-', key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(('f-', 'v-')):
+                os.remove(entry.path)
+
+    def _prune(self):
+        for prefix in ('f-', 'v-'):
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.startswith(prefix)]
+            if len(entries) <= self.threshold:
+                continue
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.threshold]:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def get_version(self, dependency):
+        path = self._path('v-', dependency)
+        version = self._read(path)
+        if not version:
+            version = new_version()
+            self._write(path, version)
+            self._wrote()
+        return version
+
+    def bump_version(self, dependency):
+        self._write(self._path('v-', dependency), new_version())
+        self._wrote()
+
+    def __len__(self):
+        return sum(1 for entry in os.scandir(self.directory) if entry.name.startswith('f-'))
+
+
+def make_backend(kind, directory, max_bytes):
+    if kind == 'filesystem':
+        return FileSystemCache(directory)
+    return MemoryCache(max_bytes)
+
+
+def dependency(value):
+    if isinstance(value, str):
+        return value
+    return f'{value.__tablename__}:{value.id}'
+
+
+def track_dependency(dep, version):
+    if has_request_context():
+        tracked = g.get('cache_dependencies')
+        if tracked is not None:
+            tracked.append((dep, version))
+
+
+class FragmentCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCache(32 * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.backend = make_backend(app.config['FRAGMENT_CACHE_BACKEND'],
+                                    app.config['FRAGMENT_CACHE_DIR'],
+                                    app.config['FRAGMENT_CACHE_MAX_BYTES'])
+        app.jinja_env.add_extension(FragmentCacheExtension)
+
+    def key(self, name, dependencies):
+        parts = [name]
+        for dep in dependencies:
+            dep = dependency(dep)
+            version = self.backend.get_version(dep)
+            track_dependency(dep, version)
+            parts.append(f'{dep}@{version}')
+        return '|'.join(parts)
+
+    def fetch(self, name, dependencies, render):
+        key = self.key(name, dependencies)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = str(render())
+        self.backend.set(key, value)
+        return value
+
+    def invalidate(self, *dependencies):
+        for dep in dependencies:
+            self.backend.bump_version(dependency(dep))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        return Markup(fragment_cache.fetch(args[0], args[1:], caller))
+
+
+def _changed(target, *names):
+    state = inspect(target)
+    return any(getattr(state.attrs, name).history.has_changes() for name in names)
+
+
+def _invalidate_later(target, *dependencies):
+    dependencies = [dependency(dep) for dep in dependencies]
+    after_commit(target, lambda: fragment_cache.invalidate(*dependencies))
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Post, 'after_delete')
+def _post_changed(mapper, connection, target):
+    _invalidate_later(target, target, 'post:*', f'category:{target.category_id}')
+
+
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_update')
+@event.listens_for(Comment, 'after_delete')
+def _comment_changed(mapper, connection, target):
+    _invalidate_later(target, f'post:{target.post_id}', 'comment:*')
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _category_changed(mapper, connection, target):
+    _invalidate_later(target, target, 'category:*')
+
+
+@event.listens_for(User, 'after_update')
+def _user_changed(mapper, connection, target):
+    if _changed(target, 'username', 'image_file'):
+        _invalidate_later(target, target, 'user:*')
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _invalidate_later(target, target, 'user:*')
@@ -0,0 +1,252 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import text
+from blog import db, counters, transfer
+from blog.jobs import Worker
+from blog.models import User, Post, Category, Comment, PostScore
+from blog.pagination import keyset_query
+from blog.posts.search import search_engine
+from blog.posts.suggest import suggestions
+from blog.posts.utils import backfill_excerpts
+from blog.rankings import rankings
+
+
+commands = Blueprint('commands', __name__, cli_group=None)
+FEED_ORDER = (Post.date_posted, Post.id)
+
+
+def route_queries():
+    now = datetime.now()
+    feeds = {
+        'posts.home': Post.query,
+        'posts.category': Post.query.filter_by(category_id=1),
+        'users.account': Post.query.filter_by(user_id=1),
+    }
+    for endpoint, query in feeds.items():
+        yield f'{endpoint} first page', keyset_query(query, FEED_ORDER), False
+        yield f'{endpoint} next page', keyset_query(query, FEED_ORDER, ('next', now, 1)), False
+        yield f'{endpoint} previous page', keyset_query(query, FEED_ORDER, ('prev', now, 1)), False
+    yield 'posts.post', Post.query.filter_by(id=1), False
+    yield 'feed comments', Comment.query.filter(Comment.post_id.in_([1, 2, 3])), False
+    yield 'feed authors', User.query.filter(User.id.in_([1, 2, 3])), False
+    yield 'users.account user', User.query.filter_by(id=1), False
+    yield 'sidebar categories', Category.query, True
+    yield 'sidebar trending', Post.query.join(PostScore).order_by(PostScore.score.desc()).limit(5), False
+    yield 'sidebar active users', User.query.order_by(User.last_activity.desc()).limit(5), False
+
+
+def explain(query):
+    sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def full_scans(plan):
+    return [step for step in plan
+            if (step.startswith('SCAN ') and ' USING ' not in step and 'VIRTUAL TABLE' not in step)
+            or step.startswith('USE TEMP B-TREE')]
+
+
+@commands.cli.command('db-explain')
+def db_explain():
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('db-explain only supports SQLite query plans.')
+    flagged = []
+    for name, query, scan_allowed in route_queries():
+        plan = explain(query)
+        scans = [] if scan_allowed else full_scans(plan)
+        status = 'FULL SCAN' if scans else 'ok'
+        print(f'{name}: {status}')
+        for step in plan:
+            print(f'    {step}')
+        if scans:
+            flagged.append(name)
+    if flagged:
+        raise click.ClickException(f'Full scans in: {", ".join(flagged)}')
+
+
+@commands.cli.command('reconcile-counters')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+def reconcile_counters(dry_run):
+    for name, drifted in counters.reconcile(fix=not dry_run):
+        print(f'{name}: {drifted} rows drifted')
+
+
+@commands.cli.command('rebuild-rankings')
+@click.option('--batch-size', default=5000, help='Rows fetched and written per round trip.')
+def rebuild_rankings(batch_size):
+    scored = rankings.rebuild(batch_size=batch_size)
+    print(f'Scored {scored} posts for trending.')
+
+
+@commands.cli.command('worker')
+@click.option('--concurrency', type=int, default=None, help='Number of jobs to run at once.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+def worker(concurrency, burst):
+    app = current_app._get_current_object()
+    job_worker = Worker(app, concurrency or app.config['JOBS_CONCURRENCY'])
+    try:
+        job_worker.run(burst=burst)
+    finally:
+        job_worker.stop()
+
+
+@commands.cli.command('seed')
+@click.option('--users', default=1000, help='Users to insert.')
+@click.option('--categories', default=10, help='Categories to insert.')
+@click.option('--posts', default=10000, help='Posts to insert.')
+@click.option('--comments', default=50000, help='Comments to insert.')
+@click.option('--skew', default=2.0, help='Popularity skew; 1 is uniform, higher concentrates posts and comments.')
+@click.option('--days', default=365, help='Spread post dates over this many days.')
+@click.option('--batch-size', default=5000, help='Rows per INSERT batch.')
+@click.option('--seed', 'random_seed', type=int, default=None, help='Random seed for reproducible data.')
+def seed(users, categories, posts, comments, skew, days, batch_size, random_seed):
+    from blog import bench
+    progress = {}
+
+    def report(table, total):
+        if progress and table not in progress:
+            click.echo()
+        progress[table] = total
+        click.echo(f'\r{table}: {total}', nl=False)
+
+    try:
+        inserted = bench.seed(users, categories, posts, comments, skew=skew, days=days,
+                              batch_size=batch_size, random_seed=random_seed, report=report)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo()
+    print(f"Indexed {inserted['search_index']} posts for search.")
+
+
+@commands.cli.group('bench')
+def bench_group():
+    pass
+
+
+def _write_report(report, output):
+    data = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+
+
+@bench_group.command('run')
+@click.option('--requests', default=200, help='Requests per endpoint, or in total for mixed runs.')
+@click.option('--concurrency', default=4, help='Client threads per process.')
+@click.option('--processes', default=1, help='Run a mixed workload from this many processes.')
+@click.option('--mode', type=click.Choice(['sequential', 'mixed']), default='sequential',
+              help='Measure endpoints one at a time, or interleave them.')
+@click.option('--mix', type=click.Choice(['all', 'read', 'write']), default='all', help='Which routes to drive.')
+@click.option('--only', multiple=True, help='Limit to an endpoint, e.g. posts.home or "posts.search POST".')
+@click.option('--seed', 'random_seed', type=int, default=None, help='Random seed for mixed schedules.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the JSON report to a file.')
+def bench_run(requests, concurrency, processes, mode, mix, only, random_seed, output):
+    from blog import bench, create_app
+    app = create_app(bench.bench_config(current_app.config))
+    for endpoint in bench.uncovered_endpoints(app):
+        click.echo(f'warning: {endpoint} has no benchmark target', err=True)
+    try:
+        report = bench.run(app, mix=mix, only=only, requests=requests, concurrency=concurrency,
+                           processes=processes, mode=mode, random_seed=random_seed)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    _write_report(report, output)
+
+
+@bench_group.command('cold-start')
+@click.option('--path', default='/', help='Path of the first request.')
+@click.option('--runs', default=5, help='Fresh interpreters to start.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the JSON report to a file.')
+def bench_cold_start(path, runs, output):
+    from blog import bench
+    _write_report(bench.cold_start(path, runs, cwd=os.path.dirname(current_app.root_path)), output)
+
+
+@bench_group.command('scenario')
+@click.argument('name')
+@click.option('--size', 'sizes', multiple=True, type=int, help="Dataset sizes; defaults to the scenario's own.")
+@click.option('--directory', type=click.Path(file_okay=False), help='Where scratch databases are created.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the JSON report to a file.')
+def bench_scenario(name, sizes, directory, output):
+    from blog import bench
+    if name not in bench.SCENARIOS:
+        raise click.BadParameter(f'choose from {", ".join(sorted(bench.SCENARIOS))}', param_hint="'NAME'")
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        report = bench.run_scenario(current_app, name, scratch, sizes)
+    _write_report(report, output)
+
+
+@bench_group.command('diff')
+@click.argument('baseline', type=click.File())
+@click.argument('current', type=click.File())
+@click.option('--threshold', default=10.0, help='Allowed p95 regression in percent.')
+def bench_diff(baseline, current, threshold):
+    from blog import bench
+    rows = bench.compare(json.load(baseline), json.load(current), threshold)
+    for row in rows:
+        flag = 'REGRESSED' if row['regressed'] else 'ok'
+        queries = '' if row['queries_change'] is None else f", queries {row['queries_change']:+}"
+        print(f"{row['endpoint']}: p95 {row['p95_old_ms']} -> {row['p95_new_ms']} ms "
+              f"({row['p95_change_pct']:+}%){queries} {flag}")
+    regressed = [row['endpoint'] for row in rows if row['regressed']]
+    if regressed:
+        raise click.ClickException(f'Regressions in: {", ".join(regressed)}')
+
+
+@commands.cli.group('blog')
+def blog_group():
+    pass
+
+
+def _progress():
+    last = {}
+
+    def report(table, done, total):
+        if last.get(table) == done:
+            return
+        last[table] = done
+        click.echo(f'\r{table}: {done}/{total}', nl=False)
+        if done == total:
+            click.echo()
+    return report
+
+
+@blog_group.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(transfer.FORMATS), default='ndjson', help='File format.')
+@click.option('--table', 'tables', multiple=True, help='Export only these tables.')
+@click.option('--batch-size', default=1000, help='Rows fetched per round trip.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted export from its checkpoint.')
+def blog_export(directory, fmt, tables, batch_size, resume):
+    try:
+        exported = transfer.export_data(directory, fmt, tables, batch_size, resume, report=_progress())
+    except transfer.TransferError as error:
+        raise click.ClickException(str(error))
+    print(f'Exported {sum(exported.values())} rows to {directory}.')
+
+
+@blog_group.command('import')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--table', 'tables', multiple=True, help='Import only these tables.')
+@click.option('--batch-size', default=1000, help='Rows per INSERT batch.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted import from its checkpoint.')
+@click.option('--keep-ids', is_flag=True, help='Insert rows with their exported ids instead of offsetting them.')
+def blog_import(directory, tables, batch_size, resume, keep_ids):
+    try:
+        imported = transfer.import_data(directory, tables, batch_size, resume, remap=not keep_ids,
+                                        report=_progress())
+    except transfer.TransferError as error:
+        raise click.ClickException(str(error))
+    counters.reconcile(fix=True)
+    backfill_excerpts()
+    search_engine.rebuild()
+    suggestions.rebuild()
+    rankings.rebuild()
+    print(f'Imported {sum(imported.values())} rows from {directory}.')
+    print('Restart running app processes so their suggestion indexes load the imported rows.')
@@ -0,0 +1,127 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+from blog import db
+from blog.cache import fragment_cache
+from blog.models import User, Post, Category, Comment
+from blog.users.activity import activity
+
+
+def _csrf_window():
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not limit:
+        return 0, None
+    width = max(1, limit // 2)
+    window = int(time.time() // width)
+    return window, datetime.fromtimestamp(window * width, timezone.utc)
+
+
+def version_key(version):
+    return hashlib.sha1(repr(version).encode()).hexdigest()
+
+
+def _etag(key, window):
+    user_id = current_user.id if current_user.is_authenticated else None
+    raw = repr((key, user_id, session.get('csrf_token'), window))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _last_modified(timestamp, window_start):
+    if timestamp is None:
+        return None
+    timestamp = timestamp.astimezone(timezone.utc)
+    if window_start is not None and window_start > timestamp:
+        return window_start
+    return timestamp
+
+
+def _cache_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional_response(key, timestamp, render):
+    window, window_start = _csrf_window()
+    last_modified = _last_modified(timestamp, window_start)
+    etag = _etag(key, window)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return _cache_headers(current_app.response_class(status=304), etag, last_modified)
+    g.conditional_key = key
+    response = make_response(render())
+    if response.status_code != 200:
+        return response
+    return _cache_headers(response, etag, last_modified)
+
+
+def conditional(validator):
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            validated = validator(**kwargs)
+            if validated is None:
+                return view(*args, **kwargs)
+            version, timestamp = validated
+            return conditional_response(version_key(version), timestamp, lambda: view(*args, **kwargs))
+        return decorated
+    return decorator
+
+
+def _versions(*dependencies):
+    return tuple(fragment_cache.backend.get_version(dep) for dep in dependencies)
+
+
+# Feeds only send an ETag: max(updated_at) does not move when a post is deleted and has
+# one-second granularity, so If-Modified-Since alone could answer 304 for a stale page.
+def feed_validator(**kwargs):
+    updated_at, posts = db.session.execute(select(
+        select(func.max(Post.updated_at)).scalar_subquery(),
+        select(func.sum(Category.post_count)).scalar_subquery())).one()
+    return (updated_at, posts, _versions('user:*', 'category:*', 'post:*')), None
+
+
+def post_validator(post_id):
+    updated_at = db.session.execute(select(Post.updated_at).where(Post.id == post_id)).scalar()
+    if updated_at is None:
+        return None
+    return (updated_at, _versions('user:*')), updated_at
+
+
+def comments_validator(post_id):
+    row = db.session.execute(select(
+        Post.comment_count,
+        select(func.max(Comment.updated_at)).where(Comment.post_id == post_id).scalar_subquery())
+        .where(Post.id == post_id)).first()
+    if row is None:
+        return None
+    comment_count, updated_at = row
+    version = (comment_count, updated_at, _versions('user:*'),
+               request.args.get('format'), request.accept_mimetypes.best)
+    return version, updated_at
+
+
+def account_validator(user_id):
+    row = db.session.execute(select(
+        User.username, User.email, User.image_file, User.post_count, User.comment_count, User.last_activity,
+        select(func.max(Post.updated_at)).where(Post.user_id == user_id).scalar_subquery())
+        .where(User.id == user_id)).first()
+    if row is None:
+        return None
+    *profile, stored_activity, updated_at = row
+    last_activity = activity.last_activity(user_id, stored_activity)
+    version = (*profile, last_activity, updated_at, _versions('category:*'))
+    return version, max(filter(None, (updated_at, last_activity)), default=None)
@@ -0,0 +1,93 @@
+import os
+
+
+class Config:
+    SECRET_KEY = str(os.environ.get('BlogKey'))
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
+    SQLITE_WRITER_ENGINE_OPTIONS = {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10}
+    SQLITE_READ_POOL = True
+    SQLITE_READER_ENGINE_OPTIONS = {'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 10}
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+        'mmap_size': 128 * 1024 * 1024,
+        'cache_size': -16000,
+    }
+
+    MAIL_SERVER = 'smtp.googlemail.com'
+    MAIL_PORT = 587
+    MAIL_USE_TLS = True
+    MAIL_USERNAME = str(os.environ.get('EMAIL_USER'))
+    MAIL_PASSWORD = str(os.environ.get('EMAIL_PASS'))
+    MAIL_DEFAULT_SENDER = str(os.environ.get('EMAIL_USER'))
+
+    SESSION_USER_CACHE_SIZE = 1024
+    SESSION_USER_CACHE_TTL = 60
+    SEARCH_BACKEND = 'fts5'
+    SUGGEST_LIMIT = 8
+    SUGGEST_MAX_ENTRIES = 500000
+    SUGGEST_MAX_AGE = 60
+    SUGGEST_BUILD_ON_START = True
+    PAGINATION_COUNT_TTL = 300
+    COMMENTS_PER_PAGE = 20
+    API_PAGE_SIZE = 20
+    API_MAX_PAGE_SIZE = 100
+    API_MAX_BATCH = 100
+    API_STREAM_BATCH = 500
+    CATEGORY_CHOICES_TTL = 300
+    ACTIVITY_FLUSH_INTERVAL = 10
+    ACTIVITY_FLUSH_SIZE = 500
+
+    UPLOAD_FOLDER = None
+    MAX_CONTENT_LENGTH = 8 * 1024 * 1024
+    AVATAR_FOLDER = None
+    AVATAR_SIZES = (256, 125, 48)
+    AVATAR_FORMATS = ('webp', 'jpeg')
+    AVATAR_MAX_PIXELS = 24 * 1000 * 1000
+    AVATAR_MAX_AGE = 365 * 24 * 3600
+    JOBS_RUN_IN_PROCESS = True
+    JOBS_CONCURRENCY = 2
+    JOBS_POLL_INTERVAL = 5
+    JOBS_LEASE = 300
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_RETRY_BACKOFF = 10
+
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_BACKEND = 'memory'
+    RATE_LIMIT_DB = None
+    RATE_LIMITS = {
+        'search': {'requests': 30, 'per': 60, 'burst': 10},
+        'auth': {'requests': 10, 'per': 60, 'burst': 5},
+        'email': {'requests': 3, 'per': 3600, 'burst': 3},
+        'heartbeat': {'requests': 12, 'per': 60, 'burst': 4},
+    }
+    CONCURRENCY_LIMITS = {'search': 4, 'auth': 4, 'email': 2, 'heartbeat': 8}
+
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE = 8
+    PASSWORD_HASH_TIMEOUT = 10
+
+    FRAGMENT_CACHE_BACKEND = 'memory'
+    FRAGMENT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    FRAGMENT_CACHE_DIR = None
+    PAGE_CACHE = True
+    PAGE_CACHE_WARM_PAGES = 3
+    PAGE_CACHE_WARM_DELAY = 1.0
+
+    RANKING_SIZE = 5
+    RANKING_REFRESH = 30
+    TRENDING_HALF_LIFE = 24 * 3600
+    TRENDING_POST_WEIGHT = 3.0
+    TRENDING_COMMENT_WEIGHT = 1.0
+
+    INSTRUMENTATION = True
+    STATS_ENABLED = os.environ.get('STATS_ENABLED') == '1'
+    REQUEST_STATS_WINDOW = 1000
+    SLOW_REQUEST_THRESHOLD = 0.5
+    SLOW_QUERY_THRESHOLD = 0.1
+    N_PLUS_ONE_THRESHOLD = 5
+    PROFILE_SAMPLE_RATE = 0.0
+    PROFILE_THRESHOLD = 0.5
+    PROFILE_DIR = None
@@ -0,0 +1,56 @@
+from sqlalchemy import func, select, update
+from blog import db
+from blog.models import User, Post, Category, Comment
+
+
+COUNTERS = [
+    ('Post.comment_count', Post, Post.comment_count, Comment, Comment.post_id),
+    ('Category.post_count', Category, Category.post_count, Post, Post.category_id),
+    ('User.post_count', User, User.post_count, Post, Post.user_id),
+    ('User.comment_count', User, User.comment_count, Comment, Comment.author_id),
+]
+
+
+def _add(column, row_id, delta):
+    model = column.class_
+    db.session.execute(update(model).where(model.id == row_id).values({column: column + delta}))
+
+
+def post_created(post):
+    _add(Category.post_count, post.category_id, 1)
+    _add(User.post_count, post.user_id, 1)
+
+
+def post_deleted(post):
+    comment_authors = db.session.execute(select(Comment.author_id, func.count())
+                                         .where(Comment.post_id == post.id)
+                                         .group_by(Comment.author_id)).all()
+    for author_id, count in comment_authors:
+        _add(User.comment_count, author_id, -count)
+    Comment.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+    _add(Category.post_count, post.category_id, -1)
+    _add(User.post_count, post.user_id, -1)
+
+
+def comment_created(comment):
+    _add(Post.comment_count, comment.post_id, 1)
+    _add(User.comment_count, comment.author_id, 1)
+
+
+def comment_deleted(comment):
+    _add(Post.comment_count, comment.post_id, -1)
+    _add(User.comment_count, comment.author_id, -1)
+
+
+def reconcile(fix=True):
+    report = []
+    for name, model, column, child, foreign_key in COUNTERS:
+        actual = select(func.count()).select_from(child).where(foreign_key == model.id)\
+            .correlate(model).scalar_subquery()
+        drifted = db.session.execute(select(func.count()).select_from(model).where(column != actual)).scalar()
+        if fix and drifted:
+            db.session.execute(update(model).where(column != actual).values({column: actual}))
+        report.append((name, drifted))
+    if fix:
+        db.session.commit()
+    return report
@@ -0,0 +1,60 @@
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+
+READER = 'reader'
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('read_only'):
+            engine = self._db.engines.get(READER)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return decorated
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_pragmas
+
+
+def file_backed(uri):
+    return uri.startswith('sqlite:///') and ':memory:' not in uri and 'mode=memory' not in uri
+
+
+def configure_binds(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not file_backed(uri):
+        return
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLITE_WRITER_ENGINE_OPTIONS'],
+                                                   **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    if app.config['SQLITE_READ_POOL'] and READER not in binds:
+        binds[READER] = dict(app.config['SQLITE_READER_ENGINE_OPTIONS'], url=uri)
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def configure_engines(app, db):
+    with app.app_context():
+        for name, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            pragmas = dict(app.config['SQLITE_PRAGMAS'])
+            if name == READER:
+                pragmas['query_only'] = 'ON'
+            event.listen(engine, 'connect', _pragma_listener(pragmas))
@@ -1,4 +1,6 @@
 from flask import Blueprint, render_template
+from blog.limits import Overloaded, RateLimited
+from blog.users.passwords import PasswordServiceBusy
 
 
 errors = Blueprint('errors', __name__)
@@ -17,3 +19,18 @@ def error_403(error):
 @errors.app_errorhandler(500)
 def error_500(error):
     return render_template('errors/500.html'), 500
+
+
+@errors.app_errorhandler(PasswordServiceBusy)
+def error_busy(error):
+    return render_template('errors/503.html'), 503, {'Retry-After': str(error.retry_after)}
+
+
+@errors.app_errorhandler(RateLimited)
+def error_rate_limited(error):
+    return render_template('errors/429.html'), 429, {'Retry-After': str(error.retry_after)}
+
+
+@errors.app_errorhandler(Overloaded)
+def error_overloaded(error):
+    return render_template('errors/503.html'), 503, {'Retry-After': str(error.retry_after)}
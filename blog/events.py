@@ -0,0 +1,22 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+
+def after_commit(target, callback):
+    session = target if isinstance(target, Session) else object_session(target)
+    if session is None:
+        callback()
+        return
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit(session):
+    callbacks = session.info.pop('after_commit', [])
+    for callback in callbacks:
+        callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_commit(session):
+    session.info.pop('after_commit', None)
@@ -0,0 +1,199 @@
+import cProfile
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import Counter, deque
+from threading import Lock
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger('blog.instrumentation')
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'sql_time', 'render_time', 'rows', 'statements', 'slow_queries',
+                 '_render_started', 'profiler')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.rows = 0
+        self.statements = Counter()
+        self.slow_queries = []
+        self._render_started = []
+        self.profiler = None
+
+    def repeated(self, threshold):
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Instrumentation:
+    def __init__(self):
+        self.app = None
+        self.window = 1000
+        self._samples = {}
+        self._lock = Lock()
+        self._profile_lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.window = app.config['REQUEST_STATS_WINDOW']
+        self.reset()
+        if not app.config['INSTRUMENTATION']:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+    def _before_request(self):
+        stats = g.request_stats = RequestStats()
+        config = self.app.config
+        if config['PROFILE_SAMPLE_RATE'] and random.random() < config['PROFILE_SAMPLE_RATE'] \
+                and self._profile_lock.acquire(blocking=False):
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None:
+            stats._render_started.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None and stats._render_started:
+            stats.render_time += time.perf_counter() - stats._render_started.pop()
+
+    def _after_request(self, response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries"',
+            f'orm;desc="{stats.rows} rows"',
+            f'render;dur={stats.render_time * 1000:.1f}',
+            f'app;dur={elapsed * 1000:.1f}',
+        ])
+        self._record(request.endpoint or 'unknown', elapsed, stats)
+        self._log(response, elapsed, stats)
+        return response
+
+    def _teardown_request(self, exc):
+        stats = current_stats()
+        if stats is None or stats.profiler is None:
+            return
+        profiler, stats.profiler = stats.profiler, None
+        profiler.disable()
+        self._profile_lock.release()
+        elapsed = time.perf_counter() - stats.started
+        if elapsed >= self.app.config['PROFILE_THRESHOLD']:
+            self._dump_profile(profiler, elapsed)
+
+    def _record(self, endpoint, elapsed, stats):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append((elapsed, stats.queries, stats.sql_time, stats.render_time, stats.rows))
+
+    def _log(self, response, elapsed, stats):
+        config = self.app.config
+        repeated = stats.repeated(config['N_PLUS_ONE_THRESHOLD'])
+        if elapsed < config['SLOW_REQUEST_THRESHOLD'] and not repeated and not stats.slow_queries:
+            return
+        record = {
+            'event': 'slow_request' if elapsed >= config['SLOW_REQUEST_THRESHOLD'] else 'request_warning',
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'queries': stats.queries,
+            'sql_ms': round(stats.sql_time * 1000, 1),
+            'render_ms': round(stats.render_time * 1000, 1),
+            'rows': stats.rows,
+            'slow_queries': stats.slow_queries,
+            'n_plus_one': [{'statement': statement, 'count': count} for statement, count in repeated],
+        }
+        logger.warning(json.dumps(record))
+
+    def _dump_profile(self, profiler, elapsed):
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        name = f'{request.endpoint or "unknown"}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.prof'
+        profiler.dump_stats(os.path.join(directory, name))
+
+    def summary(self):
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+        report = {}
+        for endpoint, values in sorted(samples.items()):
+            durations = [value[0] * 1000 for value in values]
+            report[endpoint] = {
+                'count': len(values),
+                'p50_ms': round(percentile(durations, 0.50), 2),
+                'p95_ms': round(percentile(durations, 0.95), 2),
+                'p99_ms': round(percentile(durations, 0.99), 2),
+                'max_ms': round(max(durations), 2),
+                'queries_mean': round(sum(value[1] for value in values) / len(values), 2),
+                'sql_ms_mean': round(sum(value[2] for value in values) * 1000 / len(values), 2),
+                'render_ms_mean': round(sum(value[3] for value in values) * 1000 / len(values), 2),
+                'rows_mean': round(sum(value[4] for value in values) / len(values), 2),
+            }
+        return report
+
+
+instrumentation = Instrumentation()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.queries += 1
+    stats.sql_time += elapsed
+    stats.statements[statement] += 1
+    if instrumentation.app is not None and elapsed >= instrumentation.app.config['SLOW_QUERY_THRESHOLD']:
+        stats.slow_queries.append({'statement': statement, 'duration_ms': round(elapsed * 1000, 1)})
+
+
+@event.listens_for(Session, 'loaded_as_persistent')
+def _loaded(session, instance):
+    stats = current_stats()
+    if stats is not None:
+        stats.rows += 1
@@ -0,0 +1,115 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Event, Lock, Semaphore, Thread
+from flask import current_app
+from sqlalchemy import and_, delete, insert, or_, select, update
+from blog import db
+from blog.models import Job
+
+
+TASKS = {}
+
+
+def task(name):
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+class Worker:
+    def __init__(self, app, concurrency):
+        self.app = app
+        self.concurrency = concurrency
+        self._slots = Semaphore(concurrency)
+        self._wakeup = Event()
+        self._stop = Event()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._executor.shutdown(wait=True)
+
+    def claim(self):
+        config = self.app.config
+        now = datetime.now()
+        retryable = Job.attempts < config['JOBS_MAX_ATTEMPTS']
+        next_job = select(Job.id).where(or_(Job.status == 'queued', and_(Job.status == 'running', retryable)),
+                                        Job.run_at <= now).order_by(Job.run_at).limit(1).scalar_subquery()
+        with db.engine.begin() as connection:
+            # A lease that ran out on the last attempt means the worker died mid-job; don't run it again.
+            connection.execute(update(Job).where(Job.status == 'running', Job.run_at <= now, ~retryable)
+                               .values(status='failed', last_error='Lease expired on the last attempt'))
+            return connection.execute(
+                update(Job).where(Job.id == next_job)
+                .values(status='running', attempts=Job.attempts + 1,
+                        run_at=now + timedelta(seconds=config['JOBS_LEASE']))
+                .returning(Job.id, Job.name, Job.payload, Job.attempts)).first()
+
+    def execute(self, job_id, name, payload, attempts):
+        config = self.app.config
+        try:
+            with self.app.app_context():
+                TASKS[name](**json.loads(payload))
+        except Exception as error:
+            self.app.logger.exception('Job %s (%s) failed on attempt %d', job_id, name, attempts)
+            values = {'status': 'queued', 'last_error': repr(error),
+                      'run_at': datetime.now() + timedelta(seconds=config['JOBS_RETRY_BACKOFF'] * 2 ** (attempts - 1))}
+            if attempts >= config['JOBS_MAX_ATTEMPTS']:
+                values['status'] = 'failed'
+            with self.app.app_context(), db.engine.begin() as connection:
+                connection.execute(update(Job).where(Job.id == job_id).values(values))
+        else:
+            with self.app.app_context(), db.engine.begin() as connection:
+                connection.execute(delete(Job).where(Job.id == job_id))
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def run(self, burst=False):
+        while not self._stop.is_set():
+            self._slots.acquire()
+            with self.app.app_context():
+                job = self.claim()
+            if job is None:
+                self._slots.release()
+                if burst:
+                    return
+                self._wakeup.wait(self.app.config['JOBS_POLL_INTERVAL'])
+                self._wakeup.clear()
+                continue
+            try:
+                self._executor.submit(self.execute, *job)
+            except RuntimeError:
+                # stop() shut the pool down after this job was claimed; its lease hands it back.
+                self._slots.release()
+                return
+
+
+_worker = None
+_worker_lock = Lock()
+
+
+def _in_process_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            app = current_app._get_current_object()
+            _worker = Worker(app, app.config['JOBS_CONCURRENCY'])
+            Thread(target=_worker.run, name='job-worker', daemon=True).start()
+    return _worker
+
+
+def enqueue(name, **payload):
+    if name not in TASKS:
+        raise ValueError(f'Unknown job: {name}')
+    with db.engine.begin() as connection:
+        connection.execute(insert(Job).values(name=name, payload=json.dumps(payload), status='queued',
+                                              attempts=0, run_at=datetime.now()))
+    if current_app.config['JOBS_RUN_IN_PROCESS']:
+        _in_process_worker().wake()
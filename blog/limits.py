@@ -0,0 +1,178 @@
+import math
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+from threading import BoundedSemaphore, Lock, local
+from flask import current_app, request
+from flask_login import current_user
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Overloaded(Exception):
+    retry_after = 2
+
+
+def _take(state, rate, burst, now):
+    if state is None:
+        tokens = burst
+    else:
+        tokens = min(burst, state[0] + (now - state[1]) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, wait = _take(self._buckets.get(key), rate, burst, now)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        oldest = sorted(self._buckets, key=lambda key: self._buckets[key][1])
+        for key in oldest[:len(oldest) - self.max_keys // 2]:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SqliteBuckets:
+    prune_every = 1000
+
+    def __init__(self, path, timeout=0.5, max_idle=3600):
+        self.path = path
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._local = local()
+        self._takes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS bucket '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, burst):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            state = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens, wait = _take(state, rate, burst, now)
+            connection.execute('INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                               'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                               (key, tokens, now))
+            self._takes += 1
+            if self._takes % self.prune_every == 0:
+                connection.execute('DELETE FROM bucket WHERE updated < ?', (now - self.max_idle,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+    def clear(self):
+        self._connection().execute('DELETE FROM bucket')
+
+
+def make_buckets(kind, path):
+    if kind == 'sqlite':
+        return SqliteBuckets(path)
+    return MemoryBuckets()
+
+
+class Limiter:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.limits = {}
+        self.buckets = MemoryBuckets()
+        self._slots = {}
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        self.limits = app.config['RATE_LIMITS']
+        self.buckets = make_buckets(app.config['RATE_LIMIT_BACKEND'], app.config['RATE_LIMIT_DB'])
+        self._slots = {name: BoundedSemaphore(size) for name, size in app.config['CONCURRENCY_LIMITS'].items()}
+
+    def client(self):
+        if current_user.is_authenticated:
+            return f'user:{current_user.id}'
+        return f'ip:{request.remote_addr}'
+
+    def check(self, name):
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None:
+            return
+        rate = limit['requests'] / limit['per']
+        try:
+            wait = self.buckets.take(f'{name}:{self.client()}', rate, limit.get('burst', limit['requests']))
+        except sqlite3.Error:
+            current_app.logger.exception('Rate limit store unavailable; admitting %s', request.endpoint)
+            return
+        if wait:
+            raise RateLimited(wait)
+
+    @contextmanager
+    def slot(self, name):
+        slots = self._slots.get(name)
+        if not self.enabled or slots is None:
+            yield
+            return
+        if not slots.acquire(blocking=False):
+            raise Overloaded()
+        try:
+            yield
+        finally:
+            slots.release()
+
+
+limiter = Limiter()
+
+
+def rate_limit(name, methods=None):
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            if methods is None or request.method in methods:
+                limiter.check(name)
+            return view(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def concurrency_limit(name, methods=None):
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            if methods is not None and request.method not in methods:
+                return view(*args, **kwargs)
+            with limiter.slot(name):
+                return view(*args, **kwargs)
+        return decorated
+    return decorator
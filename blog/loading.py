@@ -0,0 +1,45 @@
+from sqlalchemy.orm import configure_mappers, defer, noload, raiseload, selectinload
+from blog.models import User, Post, Category, Comment
+
+
+def _feed():
+    return [defer(Post.content, raiseload=True),
+            selectinload(Post.author),
+            selectinload(Post.category),
+            raiseload('*')]
+
+
+def _comments():
+    return [selectinload(Comment.author),
+            raiseload('*')]
+
+
+def _post_detail():
+    return [defer(Post.content),
+            selectinload(Post.author),
+            raiseload('*')]
+
+
+def _sidebar():
+    return [noload(Category.posts)]
+
+
+def _session_user():
+    return [raiseload(User.posts),
+            raiseload(User.comments)]
+
+
+PROFILES = {
+    'feed': _feed,
+    'comments': _comments,
+    'post_detail': _post_detail,
+    'sidebar': _sidebar,
+    'session_user': _session_user,
+}
+
+
+def load_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f'Unknown loading profile: {name}')
+    configure_mappers()
+    return PROFILES[name]()
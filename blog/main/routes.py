@@ -1,4 +1,10 @@
-from flask import render_template, Blueprint
+from functools import wraps
+from flask import render_template, Blueprint, jsonify, current_app, abort
+from blog.cache import fragment_cache
+from blog.instrumentation import instrumentation
+from blog.page_cache import page_cache
+from blog.posts.suggest import suggestions
+from blog.rankings import rankings
 
 
 main = Blueprint('main', __name__)
@@ -7,3 +13,25 @@ main = Blueprint('main', __name__)
 @main.route('/about')
 def about():
     return render_template('about.html')
+
+
+def stats_view(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config['STATS_ENABLED']:
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@main.route('/stats/cache')
+@stats_view
+def cache_stats():
+    return jsonify(fragment=fragment_cache.stats(), page=page_cache.stats(), suggest=suggestions.stats(),
+                   rankings=rankings.stats())
+
+
+@main.route('/stats/requests')
+@stats_view
+def request_stats():
+    return jsonify(endpoints=instrumentation.summary())
@@ -1,13 +1,11 @@
 from datetime import datetime
 from itsdangerous import URLSafeTimedSerializer as Serializer
-from blog import db, login_manager, app
+from flask import current_app
+from blog import db
 from flask_login import UserMixin
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
+EXCERPT_LENGTH = 250
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,19 +13,25 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     image_file = db.Column(db.String(20), nullable=True, default='default.jpg')
     password = db.Column(db.String(60), nullable=False)
-    posts = db.relationship('Post', backref='author', lazy='joined')
+    posts = db.relationship('Post', backref='author', lazy='select')
     last_activity = db.Column(db.DateTime, default=datetime.now)
-    comments = db.relationship('Comment', backref='author', lazy='joined')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comments = db.relationship('Comment', backref='author', lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_user_last_activity', last_activity.desc()),
+    )
 
     def get_reset_token(self):
-        serializer = Serializer(app.config['SECRET_KEY'], salt='my_salt')
+        serializer = Serializer(current_app.config['SECRET_KEY'], salt='my_salt')
         return serializer.dumps({'user_id': self.id})
 
     @staticmethod
     def verify_reset_token(token):
-        s = Serializer(app.config['SECRET_KEY'])
+        s = Serializer(current_app.config['SECRET_KEY'], salt='my_salt')
         try:
-            user_id = s.load(token)['user_id']
+            user_id = s.loads(token, max_age=1800)['user_id']
         except:
             return None
         return User.query.get(user_id)
@@ -41,9 +45,26 @@ class Post(db.Model):
     title = db.Column(db.String(100), nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.now)
     content = db.Column(db.Text, nullable=False)
+    excerpt = db.Column(db.String(EXCERPT_LENGTH), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
-    comments = db.relationship('Comment', backref='post', lazy='joined')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+    comments = db.relationship('Comment', backref='post', lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_post_date_posted_id', date_posted.desc(), id.desc()),
+        db.Index('ix_post_updated_at', updated_at),
+        db.Index('ix_post_category_id_date_posted_id', category_id, date_posted.desc(), id.desc()),
+        db.Index('ix_post_user_id_date_posted_id', user_id, date_posted.desc(), id.desc()),
+    )
+
+    @staticmethod
+    def make_excerpt(content, length=EXCERPT_LENGTH):
+        text = ' '.join(content.split())
+        if len(text) <= length:
+            return text
+        return text[:length].rsplit(' ', 1)[0]
 
     def __repr__(self):
         return f"Post: {self.title}"
@@ -52,7 +73,8 @@ class Post(db.Model):
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    posts = db.relationship('Post', backref='category', lazy='joined')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    posts = db.relationship('Post', backref='category', lazy='select')
 
     def __repr__(self):
         return f"Category: {self.name}"
@@ -64,6 +86,41 @@ class Comment(db.Model):
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.now)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_comment_post_id_date_posted_id', post_id, date_posted.desc(), id.desc()),
+        db.Index('ix_comment_author_id', author_id),
+    )
 
     def __repr__(self):
         return f"Text: {self.text}"
+
+
+class PostScore(db.Model):
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_post_score_score', score.desc()),
+    )
+
+    def __repr__(self):
+        return f"PostScore: {self.post_id} ({self.score})"
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', status, run_at),
+    )
+
+    def __repr__(self):
+        return f"Job: {self.name} ({self.status})"
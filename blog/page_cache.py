@@ -0,0 +1,192 @@
+import atexit
+import json
+import re
+from datetime import datetime
+from functools import wraps
+from threading import Event, Lock, Thread
+from flask import current_app, g, request, session, url_for
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy import event, select
+from blog import db
+from blog.cache import fragment_cache
+from blog.conditional import conditional_response, version_key
+from blog.events import after_commit
+from blog.models import Post, Category, Comment
+
+
+CSRF_PLACEHOLDER = '\x00csrf-token\x00'
+NEXT_LINK = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+class PageCache:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.warm_pages = 3
+        self.warm_delay = 1.0
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._wanted = Event()
+        self._stop = Event()
+        self._thread = None
+
+    def init_app(self, app):
+        if self.app is None:
+            atexit.register(self.close)
+        self.app = app
+        self.enabled = app.config['PAGE_CACHE']
+        self.warm_pages = app.config['PAGE_CACHE_WARM_PAGES']
+        self.warm_delay = app.config['PAGE_CACHE_WARM_DELAY']
+        self.hits = self.misses = 0
+
+    @property
+    def backend(self):
+        return fragment_cache.backend
+
+    def cacheable(self):
+        return (self.enabled and request.method in ('GET', 'HEAD') and not current_user.is_authenticated
+                and not session.get('_flashes'))
+
+    def key(self):
+        return 'page|' + request.full_path
+
+    def lookup(self):
+        entry = self.backend.get(self.key())
+        if entry is None:
+            return None
+        header, body = entry.split('\n', 1)
+        meta = json.loads(header)
+        if any(self.backend.get_version(dep) != version for dep, version in meta['dependencies']):
+            return None
+        return meta, body
+
+    def respond(self, meta, body):
+        if CSRF_PLACEHOLDER in body:
+            body = body.replace(CSRF_PLACEHOLDER, generate_csrf())
+        response = current_app.response_class(body, mimetype=meta['mimetype'])
+        for name, value in meta['headers']:
+            response.headers.add(name, value)
+        return response
+
+    def store(self, response):
+        if response.status_code != 200 or response.direct_passthrough or not self.cacheable():
+            return
+        body = response.get_data(as_text=True)
+        token = g.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+        if token:
+            body = body.replace(token, CSRF_PLACEHOLDER)
+        meta = {
+            'dependencies': g.cache_dependencies,
+            'mimetype': response.mimetype,
+            'headers': [['Link', value] for value in response.headers.getlist('Link')],
+            'rendered_at': datetime.now().isoformat(),
+            'version': g.get('conditional_key') or version_key(g.cache_dependencies),
+            'last_modified': response.last_modified.isoformat() if response.last_modified else None,
+        }
+        self.backend.set(self.key(), json.dumps(meta, separators=(',', ':')) + '\n' + body)
+
+    def schedule_warm(self):
+        if not self.enabled or not self.warm_pages:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, name='page-cache-warm', daemon=True)
+                    self._thread.start()
+        self._wanted.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wanted.wait()
+            if self._stop.wait(self.warm_delay):
+                return
+            self._wanted.clear()
+            try:
+                self.warm()
+            except Exception:
+                self.app.logger.exception('Could not pre-render feed pages')
+
+    def warm(self):
+        with self.app.app_context():
+            category_ids = db.session.execute(select(Category.id).order_by(Category.id)).scalars().all()
+        with self.app.test_request_context():
+            roots = [url_for('posts.home')] + [url_for('posts.category', category_id=category_id)
+                                               for category_id in category_ids]
+        client = self.app.test_client(use_cookies=False)
+        rendered = 0
+        for path in roots:
+            for _ in range(self.warm_pages):
+                response = client.get(path)
+                rendered += 1
+                links = [match.group(1) for value in response.headers.getlist('Link')
+                         for match in [NEXT_LINK.match(value)] if match]
+                if response.status_code != 200 or not links:
+                    break
+                path = links[0]
+        return rendered
+
+    def close(self):
+        self._stop.set()
+        self._wanted.set()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+        }
+
+
+page_cache = PageCache()
+
+
+def cached_page(dependencies):
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            if not page_cache.cacheable():
+                return view(*args, **kwargs)
+            cached = page_cache.lookup()
+            if cached is not None:
+                page_cache.hits += 1
+                meta, body = cached
+                last_modified = meta.get('last_modified')
+                return conditional_response(meta.get('version') or version_key(meta['dependencies']),
+                                            last_modified and datetime.fromisoformat(last_modified),
+                                            lambda: page_cache.respond(meta, body))
+            page_cache.misses += 1
+            g.cache_dependencies = [(dep, page_cache.backend.get_version(dep)) for dep in dependencies(**kwargs)]
+            response = current_app.make_response(view(*args, **kwargs))
+            page_cache.store(response)
+            return response
+        return decorated
+    return decorator
+
+
+def feed_dependencies(**kwargs):
+    return ['post:*', 'category:*', 'user:*']
+
+
+def category_dependencies(category_id):
+    return [f'category:{category_id}', 'post:*', 'category:*', 'user:*']
+
+
+def post_dependencies(post_id):
+    return [f'post:{post_id}', 'user:*']
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Post, 'after_delete')
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_update')
+@event.listens_for(Comment, 'after_delete')
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _content_changed(mapper, connection, target):
+    after_commit(target, page_cache.schedule_warm)
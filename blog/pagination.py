@@ -0,0 +1,133 @@
+import base64
+import binascii
+import json
+import math
+import time
+from datetime import datetime
+from threading import Lock
+from flask import request, url_for
+from sqlalchemy import func, select, tuple_
+from blog import db
+
+
+def encode_cursor(direction, page, date_value, id_value):
+    payload = json.dumps([direction, page, date_value.isoformat(), id_value], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, page, date_value, id_value = json.loads(payload)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, int(page), datetime.fromisoformat(date_value), int(id_value)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, items, page, per_page, has_prev, has_next, prev_cursor, next_cursor, total=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(1, math.ceil(self.total / self.per_page))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CountCache:
+    def __init__(self, ttl=300, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config['PAGINATION_COUNT_TTL']
+        self.clear()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                self._entries.clear()
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+approximate_counts = CountCache()
+
+
+def keyset_query(query, order_by, position=None, per_page=3):
+    date_column, id_column = order_by
+    if position is None or position[0] == 'next':
+        if position is not None:
+            query = query.filter(tuple_(date_column, id_column) < tuple_(position[1], position[2]))
+        return query.order_by(date_column.desc(), id_column.desc()).limit(per_page + 1)
+    query = query.filter(tuple_(date_column, id_column) > tuple_(position[1], position[2]))
+    return query.order_by(date_column.asc(), id_column.asc()).limit(per_page + 1)
+
+
+def keyset_paginate(query, order_by, cursor=None, per_page=3, count_key=None):
+    date_column, id_column = order_by
+    position = decode_cursor(cursor) if cursor else None
+    if position is None:
+        direction, page = 'next', 1
+        rows = keyset_query(query, order_by, per_page=per_page).all()
+    else:
+        direction, page, date_value, id_value = position
+        rows = keyset_query(query, order_by, (direction, date_value, id_value), per_page).all()
+
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if direction == 'prev':
+        items.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = page > 1, more
+
+    date_key, id_key = date_column.key, id_column.key
+    prev_cursor = next_cursor = None
+    if items and has_prev:
+        first = items[0]
+        prev_cursor = encode_cursor('prev', page - 1, getattr(first, date_key), getattr(first, id_key))
+    if items and has_next:
+        last = items[-1]
+        next_cursor = encode_cursor('next', page + 1, getattr(last, date_key), getattr(last, id_key))
+
+    total = None
+    if count_key is not None:
+        total = approximate_counts.get(count_key, lambda: db.session.execute(
+            select(func.count()).select_from(query.order_by(None).statement.subquery())).scalar())
+    return KeysetPage(items, page, per_page, has_prev, has_next, prev_cursor, next_cursor, total)
+
+
+def next_link(response, page):
+    if page.has_next:
+        url = url_for(request.endpoint, cursor=page.next_cursor, **request.view_args)
+        response.headers.add('Link', f'<{url}>; rel="next"')
+    return response
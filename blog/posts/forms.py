@@ -1,17 +1,53 @@
-from blog import app
+import time
+from threading import Lock
+from flask import current_app
 from flask_wtf import FlaskForm
+from sqlalchemy import event
 from wtforms import StringField, SubmitField, TextAreaField, SelectField
 from wtforms.validators import DataRequired, Length
+from blog.events import after_commit
 from blog.models import Category
 
 
+class CategoryChoices:
+    def __init__(self):
+        self._choices = None
+        self._expires = 0
+        self._lock = Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self._choices is None or self._expires < time.monotonic():
+                self._choices = [(name, name) for name, in
+                                 Category.query.with_entities(Category.name).order_by(Category.name)]
+                self._expires = time.monotonic() + current_app.config['CATEGORY_CHOICES_TTL']
+            return self._choices
+
+    def invalidate(self):
+        with self._lock:
+            self._choices = None
+
+
+category_choices = CategoryChoices()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _category_changed(mapper, connection, target):
+    after_commit(target, category_choices.invalidate)
+
+
 class PostForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired(), Length(3, 100)])
     content = TextAreaField('Content', validators=[DataRequired()])
-    with app.app_context():
-        category = SelectField('Category', choices=[(category.name, category.name) for category in Category.query.all()])
+    category = SelectField('Category')
     submit = SubmitField('Create')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.category.choices = category_choices()
+
 
 class SearchForm(FlaskForm):
     searched = StringField("Searched", validators=[DataRequired()])
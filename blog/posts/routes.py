@@ -1,9 +1,19 @@
-from flask import (render_template, url_for, flash,
-                   redirect, request, abort, Blueprint)
+import click
+from flask import (render_template, url_for, flash, redirect, make_response,
+                   request, abort, Blueprint, current_app, jsonify)
 from flask_login import current_user, login_required
-from blog import db
+from blog import db, counters
+from blog.conditional import conditional, feed_validator, post_validator, comments_validator
+from blog.database import read_only
+from blog.limits import concurrency_limit, rate_limit
+from blog.loading import load_profile
 from blog.models import Post, Category, Comment
+from blog.page_cache import cached_page, feed_dependencies, category_dependencies, post_dependencies
+from blog.pagination import keyset_paginate, next_link
 from blog.posts.forms import PostForm, SearchForm
+from blog.posts.search import search_engine
+from blog.posts.suggest import suggestions
+from blog.posts.utils import backfill_excerpts
 
 
 posts = Blueprint('posts', __name__)
@@ -15,8 +25,11 @@ def create_post():
     form = PostForm()
     if form.validate_on_submit():
         category = Category.query.filter_by(name=form.category.data).first()
-        post = Post(title=form.title.data, content=form.content.data, author=current_user, category=category)
+        post = Post(title=form.title.data, content=form.content.data, excerpt=Post.make_excerpt(form.content.data),
+                    user_id=current_user.id, category=category)
         db.session.add(post)
+        db.session.flush()
+        counters.post_created(post)
         db.session.commit()
         flash('The post has been created!', 'success')
         return redirect(url_for('posts.home'))
@@ -24,17 +37,38 @@ def create_post():
 
 
 @posts.route('/post/<int:post_id>')
+@read_only
+@cached_page(post_dependencies)
+@conditional(post_validator)
 def post(post_id):
-    post = Post.query.get_or_404(post_id)
+    post = Post.query.options(*load_profile('post_detail')).get_or_404(post_id)
     return render_template('post.html', post=post, title=post.title)
 
 
+@posts.route('/post/<int:post_id>/comments')
+@read_only
+@conditional(comments_validator)
+def comments(post_id):
+    comments = keyset_paginate(Comment.query.options(*load_profile('comments')).filter_by(post_id=post_id),
+                               (Comment.date_posted, Comment.id), cursor=request.args.get('cursor'),
+                               per_page=current_app.config['COMMENTS_PER_PAGE'])
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        return jsonify(comments=[{'id': comment.id,
+                                  'text': comment.text,
+                                  'date_posted': comment.date_posted.isoformat(),
+                                  'author': {'id': comment.author.id, 'username': comment.author.username}}
+                                 for comment in comments],
+                       next_cursor=comments.next_cursor)
+    return render_template('includes/comments_template.html', comments=comments, post_id=post_id)
+
+
 @posts.route('/post/<int:post_id>/delete', methods=['POST'])
 @login_required
 def delete_post(post_id):
     post = Post.query.get_or_404(post_id)
-    if post.author != current_user:
+    if post.user_id != current_user.id:
         abort(403)
+    counters.post_deleted(post)
     db.session.delete(post)
     db.session.commit()
     flash('The post has been deleted!', 'success')
@@ -45,12 +79,13 @@ def delete_post(post_id):
 @login_required
 def update_post(post_id):
     post = Post.query.get_or_404(post_id)
-    if post.author != current_user:
+    if post.user_id != current_user.id:
         abort(403)
     form = PostForm()
     if form.validate_on_submit():
         post.title = form.title.data
         post.content = form.content.data
+        post.excerpt = Post.make_excerpt(form.content.data)
         db.session.commit()
         return redirect(url_for('posts.post', post_id=post.id))
     elif request.method == 'GET':
@@ -60,23 +95,68 @@ def update_post(post_id):
 
 
 @posts.route('/category/<int:category_id>/')
+@read_only
+@cached_page(category_dependencies)
+@conditional(feed_validator)
 def category(category_id):
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter_by(category_id=category_id).order_by(Post.date_posted.desc()).paginate(page=page, per_page=3)
-    category_name = Category.query.filter_by(id=category_id).first().name
-    categories = Category.query.all()
-    return render_template('category.html', posts=posts, categories=categories, title=category_name)
-
-
-@posts.route('/search', methods=['POST'])
+    posts = keyset_paginate(Post.query.options(*load_profile('feed')).filter_by(category_id=category_id),
+                            (Post.date_posted, Post.id), cursor=request.args.get('cursor'),
+                            per_page=3, count_key=('category', category_id))
+    category_name = Category.query.options(*load_profile('sidebar')).filter_by(id=category_id).first().name
+    categories = Category.query.options(*load_profile('sidebar'))
+    return next_link(make_response(render_template('category.html', posts=posts, categories=categories,
+                                                   title=category_name)), posts)
+
+
+@posts.route('/search', methods=['GET', 'POST'])
+@read_only
+@rate_limit('search', methods=('GET',))
+@concurrency_limit('search', methods=('GET',))
 def search():
     form = SearchForm()
-    posts = Post.query
     if form.validate_on_submit():
-        post.searched = form.searched.data
-        posts = posts.filter(Post.content.like('%' + post.searched + '%'))
-        posts = posts.order_by(Post.title).all()
-        return render_template("search.html", form=form, searched=post.searched, posts=posts)
+        return redirect(url_for('posts.search', q=form.searched.data))
+    searched = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    results = search_engine.search(searched, page=page, per_page=10)
+    return render_template("search.html", form=form, searched=searched, posts=results)
+
+
+SUGGESTION_URLS = {
+    'post': lambda item_id: url_for('posts.post', post_id=item_id),
+    'category': lambda item_id: url_for('posts.category', category_id=item_id),
+    'user': lambda item_id: url_for('users.account', user_id=item_id),
+}
+
+
+@posts.route('/suggest')
+@read_only
+def suggest():
+    term = request.args.get('q', '')[:100]
+    items = suggestions.suggest(term, limit=request.args.get('limit', type=int))
+    response = jsonify(query=term, suggestions=[dict(item, url=SUGGESTION_URLS[item['type']](item['id']))
+                                                for item in items])
+    if not suggestions.built:
+        response.cache_control.no_store = True
+        return response
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['SUGGEST_MAX_AGE']
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@posts.cli.command('reindex')
+def reindex():
+    indexed = search_engine.rebuild()
+    print(f'Indexed {indexed} posts.')
+
+
+@posts.cli.command('backfill-excerpts')
+@click.option('--all', 'refresh', is_flag=True, help='Recompute every excerpt, not only missing ones.')
+@click.option('--batch-size', default=1000, help='Posts updated per transaction.')
+def backfill_excerpts_command(refresh, batch_size):
+    updated = backfill_excerpts(refresh=refresh, batch_size=batch_size)
+    print(f'Updated {updated} excerpts.')
 
 
 @posts.context_processor
@@ -86,11 +166,15 @@ def base():
 
 
 @posts.route('/')
+@read_only
+@cached_page(feed_dependencies)
+@conditional(feed_validator)
 def home():
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.date_posted.desc()).paginate(page=page, per_page=3)
-    categories = Category.query.all()
-    return render_template('home.html', posts=posts, categories=categories, title='Home')
+    posts = keyset_paginate(Post.query.options(*load_profile('feed')), (Post.date_posted, Post.id),
+                            cursor=request.args.get('cursor'), per_page=3, count_key=('home',))
+    categories = Category.query.options(*load_profile('sidebar'))
+    return next_link(make_response(render_template('home.html', posts=posts, categories=categories, title='Home')),
+                     posts)
 
 
 @posts.route('/create_comment/<post_id>/', methods=['GET', 'POST'])
@@ -103,8 +187,9 @@ def create_comment(post_id):
     else:
         post = Post.query.filter_by(id=post_id).first()
         if post:
-            comment = Comment(text=text, author=current_user, post_id=post_id)
+            comment = Comment(text=text, author_id=current_user.id, post_id=post_id)
             db.session.add(comment)
+            counters.comment_created(comment)
             db.session.commit()
             flash('Comment has been created!', 'success')
         else:
@@ -118,10 +203,11 @@ def create_comment(post_id):
 def delete_comment(comment_id):
     comment = Comment.query.filter_by(id=comment_id).first()
 
-    if current_user.id != comment.author.id and current_user.id != comment.post.author.id:
+    if current_user.id != comment.author_id and current_user.id != comment.post.user_id:
         flash("You don't have permission", 'danger')
     else:
         db.session.delete(comment)
+        counters.comment_deleted(comment)
         db.session.commit()
         flash('Comment has been deleted', 'success')
 
@@ -0,0 +1,260 @@
+import math
+import re
+from collections import Counter
+from threading import Lock
+from markupsafe import Markup, escape
+from sqlalchemy import event, inspect, select, text
+from flask import current_app
+from blog import db
+from blog.events import after_commit
+from blog.models import Post
+
+
+TOKEN_RE = re.compile(r'\w+')
+MARK_START = '\x02'
+MARK_END = '\x03'
+TITLE_WEIGHT = 10.0
+SNIPPET_TOKENS = 24
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(value.lower())
+
+
+def highlight(value):
+    html = escape(value)
+    return Markup(html.replace(MARK_START, Markup('<mark>')).replace(MARK_END, Markup('</mark>')))
+
+
+class SearchHit:
+    __slots__ = ('id', 'title', 'snippet', 'score')
+
+    def __init__(self, id, title, snippet, score):
+        self.id = id
+        self.title = highlight(title)
+        self.snippet = highlight(snippet)
+        self.score = score
+
+
+class SearchPage:
+    def __init__(self, hits, page, per_page, has_next):
+        self.items = hits
+        self.page = page
+        self.per_page = per_page
+        self.has_prev = page > 1
+        self.has_next = has_next
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if has_next else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def fts5_available(connection):
+    return connection.dialect.name == 'sqlite' and \
+        'ENABLE_FTS5' in connection.execute(text('PRAGMA compile_options')).scalars().all()
+
+
+class Fts5Backend:
+    name = 'fts5'
+
+    @staticmethod
+    def exists(connection):
+        return connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'post_fts'")).first() is not None
+
+    def index(self, connection, post_id, title, content):
+        connection.execute(text('DELETE FROM post_fts WHERE rowid = :id'), {'id': post_id})
+        connection.execute(text('INSERT INTO post_fts (rowid, title, content) VALUES (:id, :title, :content)'),
+                           {'id': post_id, 'title': title, 'content': content})
+
+    def remove(self, connection, post_id):
+        connection.execute(text('DELETE FROM post_fts WHERE rowid = :id'), {'id': post_id})
+
+    def rebuild(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS post_fts'))
+        connection.execute(text("CREATE VIRTUAL TABLE post_fts USING fts5(title, content, tokenize='unicode61')"))
+        connection.execute(text('INSERT INTO post_fts (rowid, title, content) SELECT id, title, content FROM post'))
+        return connection.execute(text('SELECT count(*) FROM post_fts')).scalar()
+
+    def search(self, term, page, per_page):
+        tokens = tokenize(term)
+        if not tokens:
+            return SearchPage([], page, per_page, False)
+        match = ' '.join('"%s"' % token for token in tokens)
+        rows = db.session.execute(text(
+            "SELECT rowid, highlight(post_fts, 0, :start, :end), "
+            "snippet(post_fts, 1, :start, :end, '…', :tokens), "
+            "bm25(post_fts, :title_weight, 1.0) AS rank "
+            "FROM post_fts WHERE post_fts MATCH :match "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"),
+            {'start': MARK_START, 'end': MARK_END, 'tokens': SNIPPET_TOKENS,
+             'title_weight': TITLE_WEIGHT, 'match': match,
+             'limit': per_page + 1, 'offset': (page - 1) * per_page}).all()
+        hits = [SearchHit(post_id, title, snippet, -rank) for post_id, title, snippet, rank in rows[:per_page]]
+        return SearchPage(hits, page, per_page, len(rows) > per_page)
+
+
+class MemoryBackend:
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._postings = {}
+        self._documents = {}
+        self._total_length = 0
+        self._built = False
+        self._lock = Lock()
+
+    def _add(self, post_id, title, content):
+        terms = Counter(tokenize(content))
+        for token, count in Counter(tokenize(title)).items():
+            terms[token] += count * TITLE_WEIGHT
+        length = sum(terms.values())
+        for token, count in terms.items():
+            self._postings.setdefault(token, {})[post_id] = count
+        self._documents[post_id] = (length, tuple(terms))
+        self._total_length += length
+
+    def _remove(self, post_id):
+        document = self._documents.pop(post_id, None)
+        if document is None:
+            return
+        length, tokens = document
+        self._total_length -= length
+        for token in tokens:
+            docs = self._postings[token]
+            del docs[post_id]
+            if not docs:
+                del self._postings[token]
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild(None)
+
+    def index(self, connection, post_id, title, content):
+        def apply():
+            with self._lock:
+                if self._built:
+                    self._remove(post_id)
+                    self._add(post_id, title, content)
+        return apply
+
+    def remove(self, connection, post_id):
+        def apply():
+            with self._lock:
+                if self._built:
+                    self._remove(post_id)
+        return apply
+
+    def rebuild(self, connection):
+        with self._lock:
+            self._postings = {}
+            self._documents = {}
+            self._total_length = 0
+            rows = db.session.execute(select(Post.id, Post.title, Post.content)
+                                      .execution_options(yield_per=1000))
+            for post_id, title, content in rows:
+                self._add(post_id, title, content)
+            self._built = True
+            return len(self._documents)
+
+    def _score(self, tokens):
+        scores = Counter()
+        count = len(self._documents)
+        average = self._total_length / count if count else 0
+        for token in set(tokens):
+            docs = self._postings.get(token, {})
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for post_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._documents[post_id][0] / average)
+                scores[post_id] += idf * tf * (self.k1 + 1) / norm
+        return scores
+
+    def search(self, term, page, per_page):
+        tokens = tokenize(term)
+        if not tokens:
+            return SearchPage([], page, per_page, False)
+        self._ensure_built()
+        with self._lock:
+            ranked = self._score(tokens).most_common(page * per_page + 1)
+        window = ranked[(page - 1) * per_page:page * per_page]
+        posts = {post.id: post for post in db.session.execute(
+            select(Post.id, Post.title, Post.content).where(Post.id.in_([post_id for post_id, _ in window])))}
+        hits = [SearchHit(post_id, _mark(posts[post_id].title, tokens),
+                          _snippet(posts[post_id].content, tokens), score)
+                for post_id, score in window if post_id in posts]
+        return SearchPage(hits, page, per_page, len(ranked) > page * per_page)
+
+
+def _mark(value, tokens):
+    return TOKEN_RE.sub(lambda m: MARK_START + m.group(0) + MARK_END if m.group(0).lower() in tokens else m.group(0),
+                        value)
+
+
+def _snippet(value, tokens):
+    words = value.split()
+    start = next((i for i, word in enumerate(words) if any(w in tokens for w in tokenize(word))), 0)
+    start = max(0, start - SNIPPET_TOKENS // 4)
+    snippet = _mark(' '.join(words[start:start + SNIPPET_TOKENS]), tokens)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + SNIPPET_TOKENS < len(words):
+        snippet += '…'
+    return snippet
+
+
+class SearchEngine:
+    def __init__(self, backend_name='fts5'):
+        self.backend_name = backend_name
+        self._backend = None
+
+    def init_app(self, app):
+        self.backend_name = app.config['SEARCH_BACKEND']
+        self._backend = None
+
+    def backend(self, connection):
+        if self._backend is None:
+            self._backend = MemoryBackend()
+            if self.backend_name == 'fts5':
+                if not fts5_available(connection):
+                    current_app.logger.warning('FTS5 is unavailable, falling back to the in-memory search index')
+                elif not Fts5Backend.exists(connection):
+                    current_app.logger.warning('The post_fts table is missing; run "flask posts reindex". '
+                                               'Falling back to the in-memory search index')
+                else:
+                    self._backend = Fts5Backend()
+        return self._backend
+
+    def search(self, term, page=1, per_page=10):
+        return self.backend(db.session.connection()).search(term, page, per_page)
+
+    def rebuild(self):
+        with db.engine.begin() as connection:
+            if self.backend_name == 'fts5' and fts5_available(connection):
+                self._backend = Fts5Backend()
+            return self.backend(connection).rebuild(connection)
+
+
+search_engine = SearchEngine()
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+def _index_post(mapper, connection, target):
+    state = inspect(target)
+    if not state.attrs.title.history.has_changes() and not state.attrs.content.history.has_changes():
+        return
+    pending = search_engine.backend(connection).index(connection, target.id, target.title, target.content)
+    if pending:
+        after_commit(target, pending)
+
+
+@event.listens_for(Post, 'after_delete')
+def _remove_post(mapper, connection, target):
+    pending = search_engine.backend(connection).remove(connection, target.id)
+    if pending:
+        after_commit(target, pending)
@@ -0,0 +1,246 @@
+import re
+from array import array
+from bisect import bisect_left, insort
+from threading import Lock, Thread
+from sqlalchemy import event, inspect, select
+from blog import db
+from blog.events import after_commit
+from blog.models import User, Post, Category
+
+
+KINDS = ('post', 'category', 'user')
+WORD_START_RE = re.compile(r'(?:^|(?<=\s))\S')
+MAX_OFFSET = 255
+MAX_WORD_STARTS = 6
+
+
+def fold(value):
+    return ' '.join(value.casefold().split())
+
+
+def _ref(kind, item_id):
+    return item_id << 2 | KINDS.index(kind)
+
+
+def _is_post(ref):
+    return ref & 3 == KINDS.index('post')
+
+
+class SuggestionIndex:
+    def __init__(self, max_entries=500000, limit=8):
+        self.max_entries = max_entries
+        self.limit = limit
+        self._labels = {}
+        self._folded = {}
+        self._starts = array('Q')
+        self._words = array('Q')
+        self._posts = array('Q')
+        self._built = False
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._thread = None
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        self.max_entries = app.config['SUGGEST_MAX_ENTRIES']
+        self.limit = app.config['SUGGEST_LIMIT']
+        with self._lock:
+            self._reset()
+        if app.config['SUGGEST_BUILD_ON_START']:
+            self.schedule_build()
+
+    @property
+    def built(self):
+        return self._built
+
+    def _reset(self):
+        self._labels = {}
+        self._folded = {}
+        self._starts = array('Q')
+        self._words = array('Q')
+        self._posts = array('Q')
+        self._built = False
+
+    def __len__(self):
+        return len(self._starts) + len(self._words)
+
+    def _array(self, offset):
+        return self._starts if offset == 0 else self._words
+
+    def _key(self, entry):
+        return self._folded[entry >> 8][entry & MAX_OFFSET:]
+
+    def _offsets(self, folded):
+        return [match.start() for match in WORD_START_RE.finditer(folded)
+                if match.start() <= MAX_OFFSET][:MAX_WORD_STARTS]
+
+    def _add(self, ref, label):
+        if ref in self._labels:
+            self._remove(ref)
+        folded = fold(label)
+        if not folded:
+            return
+        self._labels[ref] = label
+        self._folded[ref] = folded
+        for offset in self._offsets(folded):
+            insort(self._array(offset), ref << 8 | offset, key=self._key)
+        if _is_post(ref):
+            insort(self._posts, ref >> 2)
+            self._evict()
+
+    def _remove(self, ref):
+        folded = self._folded.get(ref)
+        if folded is None:
+            return
+        for offset in self._offsets(folded):
+            entry, entries = ref << 8 | offset, self._array(offset)
+            index = bisect_left(entries, folded[offset:], key=self._key)
+            while index < len(entries) and entries[index] != entry:
+                index += 1
+            if index < len(entries):
+                del entries[index]
+        del self._labels[ref]
+        del self._folded[ref]
+        if _is_post(ref):
+            index = bisect_left(self._posts, ref >> 2)
+            if index < len(self._posts) and self._posts[index] == ref >> 2:
+                del self._posts[index]
+
+    def _evict(self):
+        while len(self) > self.max_entries and self._posts:
+            self._remove(_ref('post', self._posts[0]))
+
+    def load(self, items):
+        with self._lock:
+            self._reset()
+            starts, words = [], []
+            for kind, item_id, label in items:
+                folded = fold(label or '')
+                offsets = self._offsets(folded)
+                if not offsets:
+                    continue
+                if kind == 'post' and len(starts) + len(words) + len(offsets) > self.max_entries:
+                    break
+                ref = _ref(kind, item_id)
+                self._labels[ref] = label
+                self._folded[ref] = folded
+                starts.append(ref << 8)
+                words.extend(ref << 8 | offset for offset in offsets[1:])
+                if kind == 'post':
+                    self._posts.append(item_id)
+            starts.sort(key=self._key)
+            words.sort(key=self._key)
+            self._starts = array('Q', starts)
+            self._words = array('Q', words)
+            self._posts = array('Q', sorted(self._posts))
+            self._built = True
+            return len(self._labels)
+
+    def _rows(self):
+        for category_id, name in db.session.execute(select(Category.id, Category.name)):
+            yield 'category', category_id, name
+        for user_id, username in db.session.execute(select(User.id, User.username)
+                                                    .execution_options(yield_per=1000)):
+            yield 'user', user_id, username
+        for post_id, title in db.session.execute(select(Post.id, Post.title).order_by(Post.id.desc())
+                                                 .execution_options(yield_per=1000)):
+            yield 'post', post_id, title
+
+    def rebuild(self):
+        return self.load(self._rows())
+
+    def schedule_build(self):
+        with self._build_lock:
+            if not self._built and (self._thread is None or not self._thread.is_alive()):
+                self._thread = Thread(target=self._build, name='suggest-build', daemon=True)
+                self._thread.start()
+
+    def _build(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception:
+            self.app.logger.exception('Could not build the suggestion index')
+
+    def update(self, kind, item_id, label):
+        def apply():
+            with self._lock:
+                if self._built:
+                    self._add(_ref(kind, item_id), label)
+        return apply
+
+    def remove(self, kind, item_id):
+        def apply():
+            with self._lock:
+                if self._built:
+                    self._remove(_ref(kind, item_id))
+        return apply
+
+    def suggest(self, term, limit=None):
+        prefix = fold(term)
+        if not prefix:
+            return []
+        if not self._built:
+            # Lookups stay cheap for every request; the first ones after boot find nothing instead of waiting.
+            self.schedule_build()
+            return []
+        limit = max(1, min(limit or self.limit, self.limit))
+        found = {}
+        with self._lock:
+            for entries in (self._starts, self._words):
+                index = bisect_left(entries, prefix, key=self._key)
+                while index < len(entries) and len(found) < limit:
+                    ref = entries[index] >> 8
+                    if not self._key(entries[index]).startswith(prefix):
+                        break
+                    found.setdefault(ref, self._labels[ref])
+                    index += 1
+        return [{'type': KINDS[ref & 3], 'id': ref >> 2, 'label': label} for ref, label in found.items()]
+
+    def stats(self):
+        return {'built': self._built, 'labels': len(self._labels), 'entries': len(self),
+                'posts': len(self._posts), 'max_entries': self.max_entries}
+
+
+suggestions = SuggestionIndex()
+
+
+def _changed(target, name):
+    return getattr(inspect(target).attrs, name).history.has_changes()
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+def _post_changed(mapper, connection, target):
+    if _changed(target, 'title'):
+        after_commit(target, suggestions.update('post', target.id, target.title))
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+def _category_changed(mapper, connection, target):
+    if _changed(target, 'name'):
+        after_commit(target, suggestions.update('category', target.id, target.name))
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def _user_changed(mapper, connection, target):
+    if _changed(target, 'username'):
+        after_commit(target, suggestions.update('user', target.id, target.username))
+
+
+@event.listens_for(Post, 'after_delete')
+def _post_deleted(mapper, connection, target):
+    after_commit(target, suggestions.remove('post', target.id))
+
+
+@event.listens_for(Category, 'after_delete')
+def _category_deleted(mapper, connection, target):
+    after_commit(target, suggestions.remove('category', target.id))
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    after_commit(target, suggestions.remove('user', target.id))
@@ -0,0 +1,26 @@
+from sqlalchemy import bindparam, select, update
+from blog import db
+from blog.cache import fragment_cache
+from blog.models import Post
+
+
+def backfill_excerpts(refresh=False, batch_size=1000):
+    table = Post.__table__
+    statement = update(table).where(table.c.id == bindparam('post_id')) \
+        .values(excerpt=bindparam('value'), updated_at=table.c.updated_at)
+    last_id, updated = 0, 0
+    while True:
+        query = select(table.c.id, table.c.content).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        if not refresh:
+            query = query.where(table.c.excerpt.is_(None))
+        rows = db.session.execute(query).all()
+        if not rows:
+            if updated:
+                # Core updates fire no mapper events, so nothing invalidated the cached cards and pages.
+                fragment_cache.backend.clear()
+            return updated
+        with db.engine.begin() as connection:
+            connection.execute(statement, [{'post_id': post_id, 'value': Post.make_excerpt(content)}
+                                           for post_id, content in rows])
+        last_id = rows[-1].id
+        updated += len(rows)
@@ -0,0 +1,211 @@
+import math
+from threading import Lock
+from time import monotonic
+from sqlalchemy import delete, event, insert, inspect, select, update
+from blog import db
+from blog.cache import fragment_cache
+from blog.events import after_commit
+from blog.models import User, Post, Comment, PostScore
+
+
+# Scores are log(sum(weight * 2 ** (t / half_life))) over a post's events. Every score
+# decays at the same rate, so the order only changes when an event is added and rows
+# that nothing touched never need rewriting; the log keeps the sums from overflowing.
+# Subtracting in log space loses older events to rounding, so deletes rescore the post, and
+# so does the first event on a post that has no row yet (e.g. one created before rankings).
+# Activity flushes reorder the most recent users constantly; the sidebar lists them by
+# name and only a change of membership invalidates the cached pages that show it.
+TRENDING = 'ranking:trending'
+ACTIVE = 'ranking:active'
+SCORES = PostScore.__table__
+
+
+def logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+class Rankings:
+    def __init__(self, size=5, refresh=30, half_life=24 * 3600, weights=None):
+        self.size = size
+        self.refresh = refresh
+        self.half_life = half_life
+        self.weights = weights or {'post': 3.0, 'comment': 1.0}
+        self._trending = []
+        self._active = []
+        self._loaded = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.size = app.config['RANKING_SIZE']
+        self.refresh = app.config['RANKING_REFRESH']
+        self.half_life = app.config['TRENDING_HALF_LIFE']
+        self.weights = {'post': app.config['TRENDING_POST_WEIGHT'],
+                        'comment': app.config['TRENDING_COMMENT_WEIGHT']}
+        app.add_template_global(self.trending, 'trending_posts')
+        app.add_template_global(self.active, 'active_users')
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._trending = []
+        self._active = []
+        self._loaded = {}
+
+    def points(self, kind, when):
+        return math.log(self.weights[kind]) + when.timestamp() * math.log(2) / self.half_life
+
+    def _stale(self, name):
+        loaded = self._loaded.get(name)
+        return loaded is None or monotonic() - loaded > self.refresh
+
+    def _publish(self, name, dependency, entries, key=list):
+        with self._lock:
+            previous = key(entry['id'] for entry in getattr(self, '_' + name))
+            setattr(self, '_' + name, entries)
+            self._loaded[name] = monotonic()
+        if previous != key(entry['id'] for entry in entries):
+            fragment_cache.invalidate(dependency)
+
+    def load_trending(self):
+        with db.engine.connect() as connection:
+            rows = connection.execute(select(Post.id, Post.title, SCORES.c.score)
+                                      .join(SCORES, SCORES.c.post_id == Post.id)
+                                      .order_by(SCORES.c.score.desc()).limit(self.size)).all()
+        self._publish('trending', TRENDING, [{'id': post_id, 'title': title, 'score': score}
+                                              for post_id, title, score in rows])
+
+    def load_active(self):
+        with db.engine.connect() as connection:
+            rows = connection.execute(select(User.id, User.username, User.last_activity)
+                                      .where(User.last_activity.isnot(None))
+                                      .order_by(User.last_activity.desc()).limit(self.size)).all()
+        entries = sorted(({'id': user_id, 'username': username, 'last_activity': last_activity}
+                          for user_id, username, last_activity in rows), key=lambda entry: entry['username'].lower())
+        self._publish('active', ACTIVE, entries, key=frozenset)
+
+    def trending(self):
+        if self._stale('trending'):
+            self.load_trending()
+        return self._trending
+
+    def active(self):
+        if self._stale('active'):
+            self.load_active()
+        return self._active
+
+    def add(self, connection, post_id, points):
+        current = connection.execute(select(SCORES.c.score).where(SCORES.c.post_id == post_id)).scalar()
+        if current is None:
+            return self.rescore(connection, post_id)
+        score = logaddexp(current, points)
+        connection.execute(update(SCORES).where(SCORES.c.post_id == post_id).values(score=score))
+        return score
+
+    def score(self, post_date, comment_dates):
+        score = self.points('post', post_date)
+        for date_posted in comment_dates:
+            score = logaddexp(score, self.points('comment', date_posted))
+        return score
+
+    def rescore(self, connection, post_id):
+        post_date = connection.execute(select(Post.date_posted).where(Post.id == post_id)).scalar()
+        if post_date is None:
+            connection.execute(delete(SCORES).where(SCORES.c.post_id == post_id))
+            return None
+        comment_dates = connection.execute(select(Comment.date_posted).where(Comment.post_id == post_id)).scalars()
+        score = self.score(post_date, comment_dates)
+        if not connection.execute(update(SCORES).where(SCORES.c.post_id == post_id).values(score=score)).rowcount:
+            connection.execute(insert(SCORES).values(post_id=post_id, score=score))
+        return score
+
+    def changed(self, post_id, score, renamed=False):
+        def apply():
+            with self._lock:
+                entries = self._trending
+                member = next((entry for entry in entries if entry['id'] == post_id), None)
+                if 'trending' not in self._loaded:
+                    reload = True
+                elif member is None:
+                    reload = score is not None and (len(entries) < self.size or score > entries[-1]['score'])
+                else:
+                    reload = renamed or score is None or score < member['score']
+                    if not reload:
+                        member = dict(member, score=score)
+                        entries = sorted([member] + [entry for entry in entries if entry['id'] != post_id],
+                                         key=lambda entry: -entry['score'])
+            if reload:
+                self.load_trending()
+            elif member is not None:
+                self._publish('trending', TRENDING, entries)
+        return apply
+
+    def rebuild(self, batch_size=5000):
+        scores = {}
+        posts = db.session.execute(select(Post.id, Post.date_posted).execution_options(yield_per=batch_size))
+        for post_id, date_posted in posts:
+            scores[post_id] = self.points('post', date_posted)
+        comments = db.session.execute(select(Comment.post_id, Comment.date_posted)
+                                      .execution_options(yield_per=batch_size))
+        for post_id, date_posted in comments:
+            current = scores.get(post_id)
+            if current is not None:
+                scores[post_id] = logaddexp(current, self.points('comment', date_posted))
+        db.session.execute(delete(SCORES))
+        rows = [{'post_id': post_id, 'score': score} for post_id, score in scores.items()]
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(insert(SCORES), rows[start:start + batch_size])
+        db.session.commit()
+        with self._lock:
+            self._reset()
+        fragment_cache.invalidate(TRENDING, ACTIVE)
+        return len(rows)
+
+    def stats(self):
+        return {'size': self.size, 'trending': [entry['id'] for entry in self._trending],
+                'active': [entry['id'] for entry in self._active]}
+
+
+rankings = Rankings()
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_created(mapper, connection, target):
+    score = rankings.add(connection, target.id, rankings.points('post', target.date_posted))
+    after_commit(target, rankings.changed(target.id, score))
+
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, target):
+    if inspect(target).attrs.title.history.has_changes():
+        after_commit(target, rankings.changed(target.id, None, renamed=True))
+
+
+@event.listens_for(Post, 'after_delete')
+def _post_deleted(mapper, connection, target):
+    connection.execute(delete(SCORES).where(SCORES.c.post_id == target.id))
+    after_commit(target, rankings.changed(target.id, None))
+
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_created(mapper, connection, target):
+    score = rankings.add(connection, target.post_id, rankings.points('comment', target.date_posted))
+    after_commit(target, rankings.changed(target.post_id, score))
+
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, target):
+    score = rankings.rescore(connection, target.post_id)
+    after_commit(target, rankings.changed(target.post_id, score))
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    after_commit(target, rankings.load_active)
+
+
+@event.listens_for(User, 'after_update')
+def _user_renamed(mapper, connection, target):
+    if inspect(target).attrs.username.history.has_changes():
+        after_commit(target, rankings.load_active)
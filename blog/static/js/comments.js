@@ -0,0 +1,31 @@
+document.addEventListener('DOMContentLoaded', function () {
+  function loadComments(url, target, replace) {
+    fetch(url, {headers: {'Accept': 'text/html'}})
+      .then(function (response) { return response.text(); })
+      .then(function (html) {
+        if (replace) {
+          replace.insertAdjacentHTML('beforebegin', html);
+          replace.remove();
+        } else {
+          target.innerHTML = html;
+        }
+      });
+  }
+
+  document.querySelectorAll('[data-comments-url]').forEach(function (container) {
+    container.addEventListener('show.bs.collapse', function () {
+      if (!container.dataset.loaded) {
+        container.dataset.loaded = 'true';
+        loadComments(container.dataset.commentsUrl, container);
+      }
+    });
+  });
+
+  document.addEventListener('click', function (event) {
+    var link = event.target.closest('.load-more-comments');
+    if (link) {
+      event.preventDefault();
+      loadComments(link.href, link.parentElement, link);
+    }
+  });
+});
@@ -0,0 +1,35 @@
+document.addEventListener('DOMContentLoaded', function () {
+  document.querySelectorAll('[data-suggest-url]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var last = '';
+
+    function render(suggestions) {
+      list.innerHTML = '';
+      suggestions.forEach(function (suggestion) {
+        var option = document.createElement('option');
+        option.value = suggestion.label;
+        option.label = suggestion.type;
+        list.appendChild(option);
+      });
+    }
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      var term = input.value.trim();
+      if (!term || term === last) {
+        return;
+      }
+      timer = setTimeout(function () {
+        last = term;
+        fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(term), {headers: {'Accept': 'application/json'}})
+          .then(function (response) { return response.json(); })
+          .then(function (data) {
+            if (data.query === input.value.trim()) {
+              render(data.suggestions);
+            }
+          });
+      }, 150);
+    });
+  });
+});
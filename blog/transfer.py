@@ -0,0 +1,216 @@
+import csv
+import json
+import os
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from blog import db
+from blog.models import User, Post, Category, Comment
+
+
+TABLES = [User.__table__, Category.__table__, Post.__table__, Comment.__table__]
+FORMATS = ('ndjson', 'csv')
+MANIFEST = 'manifest.json'
+EXPORT_CHECKPOINT = '.export-checkpoint.json'
+IMPORT_CHECKPOINT = '.import-checkpoint.json'
+
+
+class TransferError(Exception):
+    pass
+
+
+def _tables(names=None):
+    if not names:
+        return TABLES
+    unknown = set(names) - {table.name for table in TABLES}
+    if unknown:
+        raise TransferError(f'Unknown tables: {", ".join(sorted(unknown))}')
+    return [table for table in TABLES if table.name in names]
+
+
+def _path(directory, table, fmt):
+    return os.path.join(directory, f'{table.name}.{fmt}')
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _dump(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _load(column, value):
+    if value is None or (value == '' and column.nullable):
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Integer):
+        return int(value)
+    return value
+
+
+class _Writer:
+    def __init__(self, f, fmt, columns, header):
+        self.f = f
+        self.fmt = fmt
+        self.columns = columns
+        if fmt == 'csv':
+            self.csv = csv.writer(f)
+            if header:
+                self.csv.writerow(columns)
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.csv.writerow(['' if value is None else _dump(value) for value in row])
+        else:
+            self.f.write(json.dumps(dict(zip(self.columns, map(_dump, row))), separators=(',', ':')) + '\n')
+
+
+def _reader(f, fmt):
+    if fmt == 'csv':
+        return csv.DictReader(f)
+    return (json.loads(line) for line in f if line.strip())
+
+
+def export_data(directory, fmt='ndjson', tables=None, batch_size=1000, resume=False,
+                report=lambda table, done, total: None):
+    if fmt not in FORMATS:
+        raise TransferError(f'Unknown format: {fmt}')
+    os.makedirs(directory, exist_ok=True)
+    checkpoint_path = os.path.join(directory, EXPORT_CHECKPOINT)
+    checkpoint = _read_json(checkpoint_path, {}) if resume else {}
+    if checkpoint and checkpoint.get('format') != fmt:
+        raise TransferError('The checkpoint was written for another format.')
+    checkpoint['format'] = fmt
+    progress = checkpoint.setdefault('tables', {})
+    manifest = {'format': fmt, 'exported_at': datetime.now().isoformat(timespec='seconds'), 'tables': []}
+
+    for table in _tables(tables):
+        columns = [column.name for column in table.columns]
+        state = progress.get(table.name, {'last_id': 0, 'offset': 0, 'rows': 0})
+        total = db.session.execute(select(func.count()).select_from(table)).scalar()
+        path = _path(directory, table, fmt)
+        mode = 'r+' if state['offset'] and os.path.exists(path) else 'w'
+        with open(path, mode, newline='', encoding='utf-8') as f:
+            f.truncate(state['offset'])
+            f.seek(state['offset'])
+            writer = _Writer(f, fmt, columns, header=state['offset'] == 0)
+            rows = db.session.execute(select(table).where(table.c.id > state['last_id']).order_by(table.c.id)
+                                      .execution_options(yield_per=batch_size))
+            for partition in rows.partitions():
+                for row in partition:
+                    writer.write(row)
+                f.flush()
+                os.fsync(f.fileno())
+                state = {'last_id': partition[-1].id, 'offset': f.tell(), 'rows': state['rows'] + len(partition)}
+                progress[table.name] = state
+                _write_json(checkpoint_path, checkpoint)
+                report(table.name, state['rows'], total)
+        progress[table.name] = state
+        manifest['tables'].append({'name': table.name, 'file': os.path.basename(path),
+                                   'columns': columns, 'rows': state['rows']})
+        report(table.name, state['rows'], total)
+
+    _write_json(os.path.join(directory, MANIFEST), manifest)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {entry['name']: entry['rows'] for entry in manifest['tables']}
+
+
+def _imported(table, offset):
+    return db.session.execute(select(func.count()).select_from(table).where(table.c.id > offset)).scalar()
+
+
+def _checkpoint(tables, remap):
+    offsets = {table.name: 0 for table in TABLES}
+    if remap:
+        for table in tables:
+            offsets[table.name] = db.session.execute(select(func.max(table.c.id))).scalar() or 0
+    baseline = {table.name: _imported(table, offsets[table.name]) for table in tables}
+    return {'offsets': offsets, 'baseline': baseline}
+
+
+def _translate(table, offsets):
+    shifts = {}
+    for column in table.columns:
+        if column.primary_key:
+            shifts[column.name] = offsets[table.name]
+        for key in column.foreign_keys:
+            shifts[column.name] = offsets[key.column.table.name]
+    return shifts
+
+
+def import_data(directory, tables=None, batch_size=1000, resume=False, remap=True,
+                report=lambda table, done, total: None):
+    manifest = _read_json(os.path.join(directory, MANIFEST))
+    if manifest is None:
+        raise TransferError(f'No {MANIFEST} in {directory}; export the data first.')
+    fmt = manifest['format']
+    checkpoint_path = os.path.join(directory, IMPORT_CHECKPOINT)
+    checkpoint = _read_json(checkpoint_path) if resume else None
+    if checkpoint is None:
+        checkpoint = _checkpoint(_tables(tables), remap)
+        _write_json(checkpoint_path, checkpoint)
+    offsets = checkpoint['offsets']
+    entries = {entry['name']: entry for entry in manifest['tables']}
+    imported = {}
+
+    for table in _tables(tables):
+        entry = entries.get(table.name)
+        if entry is None:
+            continue
+        columns = {column.name: column for column in table.columns}
+        unknown = set(entry['columns']) - set(columns)
+        if unknown:
+            raise TransferError(f'{table.name} has columns this schema lacks: {", ".join(sorted(unknown))}')
+        shifts = _translate(table, offsets)
+        done = resume_from = _imported(table, offsets[table.name]) - checkpoint['baseline'].get(table.name, 0)
+        skipped = 0
+        batch = []
+
+        def flush():
+            nonlocal done
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(table), batch)
+            except IntegrityError as error:
+                raise TransferError(f'{table.name} rows {done + 1}-{done + len(batch)} conflict with existing '
+                                    f'data: {error.orig}')
+            done += len(batch)
+            report(table.name, done, entry['rows'])
+            batch.clear()
+
+        with open(os.path.join(directory, entry['file']), newline='', encoding='utf-8') as f:
+            for record in _reader(f, fmt):
+                if skipped < resume_from:
+                    skipped += 1
+                    continue
+                row = {name: _load(columns[name], value) for name, value in record.items()}
+                for name, shift in shifts.items():
+                    if shift and row.get(name) is not None:
+                        row[name] += shift
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+        imported[table.name] = done
+        report(table.name, done, entry['rows'])
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return imported
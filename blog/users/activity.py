@@ -0,0 +1,83 @@
+import atexit
+from threading import Event, Lock, Thread
+from sqlalchemy import update
+from blog import db
+from blog.models import User
+from blog.rankings import rankings
+
+
+class ActivityBuffer:
+    def __init__(self, interval=10, max_pending=500):
+        self.app = None
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def init_app(self, app):
+        if self.app is None:
+            atexit.register(self.close)
+        else:
+            self.flush()
+        self.app = app
+        self.interval = app.config['ACTIVITY_FLUSH_INTERVAL']
+        self.max_pending = app.config['ACTIVITY_FLUSH_SIZE']
+
+    def record(self, user_id, when):
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or when > current:
+                self._pending[user_id] = when
+            full = len(self._pending) >= self.max_pending
+        self._start()
+        if full:
+            self.flush()
+
+    def last_activity(self, user_id, stored):
+        pending = self._pending.get(user_id)
+        if pending is None or (stored is not None and stored >= pending):
+            return stored
+        return pending
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            rows = [{'id': user_id, 'last_activity': when} for user_id, when in pending.items()]
+            try:
+                with self.app.app_context():
+                    db.session.execute(update(User), rows)
+                    db.session.commit()
+                    rankings.load_active()
+            except Exception:
+                self.app.logger.exception('Could not flush %d activity updates', len(rows))
+                with self._lock:
+                    for user_id, when in pending.items():
+                        current = self._pending.get(user_id)
+                        if current is None or when > current:
+                            self._pending[user_id] = when
+                return 0
+            return len(rows)
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, name='activity-flush', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+activity = ActivityBuffer()
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+import warnings
+from PIL import Image, ImageOps, features
+from flask import current_app, url_for
+from sqlalchemy import select
+from blog import db
+from blog.models import User
+
+
+HASH_RE = re.compile(r'^[0-9a-f]{16}$')
+FILE_RE = re.compile(r'^([0-9a-f]{16})-(\d+)\.(webp|jpg)$')
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+SAVE_OPTIONS = {'webp': {'quality': 80, 'method': 4}, 'jpeg': {'quality': 85, 'optimize': True, 'progressive': True}}
+
+
+class AvatarError(Exception):
+    pass
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def formats():
+    return [fmt for fmt in current_app.config['AVATAR_FORMATS'] if fmt != 'webp' or features.check('webp')]
+
+
+def filename(name, size, fmt):
+    return f'{name}-{size}.{EXTENSIONS[fmt]}'
+
+
+def _decode(path, largest):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            image = Image.open(path)
+        except (Image.UnidentifiedImageError, Image.DecompressionBombError, Image.DecompressionBombWarning) as error:
+            raise AvatarError(f'Unreadable image: {error}')
+    width, height = image.size
+    if width * height > current_app.config['AVATAR_MAX_PIXELS']:
+        image.close()
+        raise AvatarError(f'Image is too large to decode: {width}x{height}')
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    return image
+
+
+def _write(image, path, fmt):
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        image.save(f, fmt.upper(), **SAVE_OPTIONS[fmt])
+    os.replace(tmp, path)
+
+
+def process_upload(upload_path):
+    folder = current_app.config['AVATAR_FOLDER']
+    sizes = sorted(current_app.config['AVATAR_SIZES'], reverse=True)
+    name = content_hash(upload_path)
+    targets = [(size, fmt, os.path.join(folder, filename(name, size, fmt))) for size in sizes for fmt in formats()]
+    if all(os.path.exists(path) for _, _, path in targets):
+        return name
+    os.makedirs(folder, exist_ok=True)
+    image = _decode(upload_path, sizes[0])
+    try:
+        for size in sizes:
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for target_size, fmt, path in targets:
+                if target_size == size and not os.path.exists(path):
+                    _write(image, path, fmt)
+    finally:
+        image.close()
+    return name
+
+
+def avatar_url(image_file, size=125, fmt='jpeg'):
+    if image_file and HASH_RE.match(image_file):
+        return url_for('users.avatar', filename=filename(image_file, size, fmt))
+    return url_for('static', filename='images/' + (image_file or 'default.jpg'))
+
+
+def collect_garbage(min_age=3600, dry_run=False):
+    folder = current_app.config['AVATAR_FOLDER']
+    if not os.path.isdir(folder):
+        return []
+    referenced = set(db.session.execute(select(User.image_file).distinct()).scalars())
+    cutoff = time.time() - min_age
+    removed = []
+    for entry in os.scandir(folder):
+        if not entry.name.startswith('.tmp'):
+            match = FILE_RE.match(entry.name)
+            if match is None or match.group(1) in referenced:
+                continue
+        if entry.stat().st_mtime > cutoff:
+            continue
+        removed.append(entry.name)
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return removed
@@ -0,0 +1,86 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from threading import BoundedSemaphore, Lock
+import bcrypt
+
+
+class PasswordServiceBusy(Exception):
+    retry_after = 5
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed):
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_pending=8, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(max(workers, 1) + max_pending)
+        self._executor = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._slots = BoundedSemaphore(max(self.workers, 1) + app.config['PASSWORD_HASH_QUEUE'])
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context('forkserver'))
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _run(self, func, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordServiceBusy()
+        if self.workers == 0:
+            try:
+                return func(*args)
+            finally:
+                slots.release()
+        try:
+            future = self._pool().submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PasswordServiceBusy()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, hashed, password):
+        return self._run(_check, hashed, password)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+
+passwords = PasswordHasher()
@@ -1,21 +1,35 @@
 from datetime import datetime
-from flask import render_template, url_for, flash, redirect, request, Blueprint
+import click
+from flask import (render_template, url_for, flash, redirect, request, Blueprint,
+                   current_app, send_from_directory, abort)
 from flask_login import login_user, current_user, logout_user, login_required
-from blog import db, bcrypt
+from blog import db
+from blog.conditional import conditional, account_validator
+from blog.database import read_only
+from blog.limits import concurrency_limit, rate_limit
+from blog.loading import load_profile
 from blog.models import User, Post
+from blog.pagination import keyset_paginate
 from blog.users.forms import (RegisterForm, LoginForm, UpdateAccountForm,
                               RequestResetForm, ResetPasswordForm)
+from blog.users.activity import activity
+from blog.users.avatars import FILE_RE, avatar_url, collect_garbage
+from blog.users.passwords import passwords
+from blog.users.session import session_users
 from blog.users.utils import save_picture, send_reset_email
 
 
 users = Blueprint('users', __name__)
+users.add_app_template_global(avatar_url)
 
 
 @users.route('/register', methods=['GET', 'POST'])
+@rate_limit('auth', methods=('POST',))
+@concurrency_limit('auth', methods=('POST',))
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = passwords.hash(form.password.data)
         user = User(username=form.username.data, email=form.email.data, password=hashed_password)
         db.session.add(user)
         db.session.commit()
@@ -25,11 +39,16 @@ def register():
 
 
 @users.route('/login', methods=['GET', 'POST'])
+@rate_limit('auth', methods=('POST',))
+@concurrency_limit('auth', methods=('POST',))
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and passwords.check(user.password, form.password.data):
+            if passwords.needs_rehash(user.password):
+                user.password = passwords.hash(form.password.data)
+                db.session.commit()
             login_user(user)
             flash('You have just been loged in!', 'success')
             return redirect(url_for('posts.home'))
@@ -41,48 +60,78 @@ def login():
 @users.route('/logout')
 @login_required
 def logout():
+    session_users.invalidate(current_user.id)
     logout_user()
     return redirect(url_for('posts.home'))
 
 
 @users.route('/account/<int:user_id>')
+@read_only
+@conditional(account_validator)
 def account(user_id):
     user = User.query.get(user_id)
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter_by(author=user).order_by(Post.date_posted.desc()).paginate(page=page, per_page=3)
-    image_file = url_for('static', filename='images/' + user.image_file)
-    return render_template('account.html', user=user, posts=posts, image_file=image_file, title='Account')
+    posts = keyset_paginate(Post.query.options(*load_profile('feed')).filter_by(user_id=user.id),
+                            (Post.date_posted, Post.id), cursor=request.args.get('cursor'),
+                            per_page=3, count_key=('account', user.id))
+    last_activity = activity.last_activity(user.id, user.last_activity)
+    return render_template('account.html', user=user, posts=posts,
+                           last_activity=last_activity, title='Account')
+
+
+@users.route('/avatars/<filename>')
+def avatar(filename):
+    if not FILE_RE.match(filename):
+        abort(404)
+    max_age = current_app.config['AVATAR_MAX_AGE']
+    response = send_from_directory(current_app.config['AVATAR_FOLDER'], filename, max_age=max_age, etag=False)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@users.cli.command('gc-avatars')
+@click.option('--min-age', default=3600, help='Keep files younger than this many seconds.')
+@click.option('--dry-run', is_flag=True, help='List orphaned files without deleting them.')
+def gc_avatars(min_age, dry_run):
+    removed = collect_garbage(min_age=min_age, dry_run=dry_run)
+    for name in removed:
+        print(name)
+    print(f"{'Would remove' if dry_run else 'Removed'} {len(removed)} avatar files.")
 
 @users.route('/update_activity', methods=['POST'])
 @login_required
+@rate_limit('heartbeat')
+@concurrency_limit('heartbeat')
 def update_activity():
     data = request.get_json()
     last_activity = datetime.fromtimestamp(int(data['last_activity'])/1000.0)
-    user_activity = User.query.filter_by(id=current_user.id).first()
-    user_activity.last_activity =  last_activity
-    db.session.commit()
+    activity.record(current_user.id, last_activity)
     return 'OK'
 
 
 @users.route('/update_account', methods=['GET', 'POST'])
+@login_required
 def update_account():
+    user = User.query.options(*load_profile('session_user')).get(current_user.id)
     form = UpdateAccountForm()
     if form.validate_on_submit():
-        if form.picture.data:
-                picture_file = save_picture(form.picture.data)
-                current_user.image_file = picture_file
-        current_user.username = form.username.data
-        current_user.email = form.email.data
+        user.username = form.username.data
+        user.email = form.email.data
         db.session.commit()
+        session_users.invalidate(user.id)
+        if form.picture.data:
+            save_picture(user.id, form.picture.data)
         flash('Your account has been updated!', 'success')
         return redirect(url_for('users.account', user_id=current_user.id))
     elif request.method == 'GET':
-        form.username.data = current_user.username
-        form.email.data = current_user.email
+        form.username.data = user.username
+        form.email.data = user.email
     return render_template('update_account.html', form=form, title='Account')
 
 
 @users.route('/reset_password', methods=['GET', 'POST'])
+@rate_limit('email', methods=('POST',))
+@concurrency_limit('email', methods=('POST',))
 def reset_request():
     if current_user.is_authenticated:
         return redirect(url_for('posts.home'))
@@ -105,9 +154,10 @@ def reset_token(token):
         return redirect(url_for('users.reset_request'))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = passwords.hash(form.password.data)
         user.password = hashed_password
         db.session.commit()
+        session_users.invalidate(user.id)
         flash('Your password has been updated! You are now to log in', 'success')
         return redirect(url_for('users.login'))
     return render_template('reset_token.html', form=form, title='Reset Password')
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from blog import db, login_manager
+from blog.models import User
+
+
+class SessionUser:
+    __slots__ = ('id', 'username', 'image_file')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, username, image_file):
+        self.id = id
+        self.username = username
+        self.image_file = image_file
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, (SessionUser, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'SessionUser: {self.username}'
+
+
+class SessionUserCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config['SESSION_USER_CACHE_SIZE']
+        self.ttl = app.config['SESSION_USER_CACHE_TTL']
+        self.clear()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+session_users = SessionUserCache()
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    user = session_users.get(user_id)
+    if user is None:
+        row = db.session.query(User.id, User.username, User.image_file).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        user = SessionUser(*row)
+        session_users.set(user_id, user)
+    return user
@@ -1,29 +1,50 @@
 import os
 import secrets
-from PIL import Image
-from flask import url_for
+from flask import current_app, url_for
 from flask_mail import Message
-from blog import app, mail
+from blog import db, mail
+from blog.jobs import enqueue, task
+from blog.models import User
+from blog.users.avatars import AvatarError, process_upload
+from blog.users.session import session_users
 
 
-def save_picture(form_picture):
+def save_picture(user_id, form_picture):
     random_hex = secrets.token_hex(8)
     _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(app.root_path, 'static/images', picture_fn)
+    upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], random_hex + f_ext)
+    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+    form_picture.save(upload_path)
+    enqueue('process_picture', user_id=user_id, upload_path=upload_path)
 
-    output_size = (125, 125)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
 
-    return picture_fn
+@task('process_picture')
+def process_picture(user_id, upload_path):
+    if not os.path.exists(upload_path):
+        return
+    try:
+        picture_fn = process_upload(upload_path)
+    except AvatarError as error:
+        current_app.logger.warning('Rejected avatar upload for user %s: %s', user_id, error)
+        os.remove(upload_path)
+        return
+
+    User.query.filter_by(id=user_id).update({User.image_file: picture_fn})
+    db.session.commit()
+    session_users.invalidate(user_id)
+    os.remove(upload_path)
 
 
 def send_reset_email(user):
     token = user.get_reset_token()
-    msg = Message('Password Reset Request', recipients=[user.email])
+    enqueue('send_reset_email', email=user.email,
+            reset_url=url_for('users.reset_token', token=token, _external=True))
+
+
+@task('send_reset_email')
+def deliver_reset_email(email, reset_url):
+    msg = Message('Password Reset Request', recipients=[email])
     msg.body = f'''To reset your password, visit the following link:
-    {url_for('users.reset_token', token=token, _external=True)}
+    {reset_url}
     '''
     mail.send(msg)
@@ -0,0 +1,43 @@
+"""post and comment updated_at for conditional requests
+
+Revision ID: 3a9e7c52d1f8
+Revises: f4c2d9e81b06
+Create Date: 2026-10-18 15:12:44.608213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9e7c52d1f8'
+down_revision = 'f4c2d9e81b06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute('UPDATE post SET updated_at = date_posted')
+    op.execute('UPDATE comment SET updated_at = date_posted')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_post_updated_at', ['updated_at'], unique=False)
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_updated_at')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,29 @@
+"""full-text search index for posts
+
+Revision ID: 4c1e9a7d2b3f
+Revises: 123f05479309
+Create Date: 2026-10-18 10:12:31.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e9a7d2b3f'
+down_revision = '123f05479309'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content, tokenize='unicode61')")
+    op.execute("INSERT INTO post_fts (rowid, title, content) SELECT id, title, content FROM post")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS post_fts")
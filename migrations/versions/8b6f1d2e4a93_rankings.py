@@ -0,0 +1,73 @@
+"""trending post scores and last activity index
+
+Revision ID: 8b6f1d2e4a93
+Revises: c5d18a3e7f42
+Create Date: 2026-10-18 21:12:47.604318
+
+"""
+import math
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b6f1d2e4a93'
+down_revision = 'c5d18a3e7f42'
+branch_labels = None
+depends_on = None
+
+post = sa.table('post', sa.column('id', sa.Integer), sa.column('date_posted', sa.DateTime))
+comment = sa.table('comment', sa.column('post_id', sa.Integer), sa.column('date_posted', sa.DateTime))
+post_score = sa.table('post_score', sa.column('post_id', sa.Integer), sa.column('score', sa.Float))
+
+
+def _logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _fill_scores(batch_size=5000):
+    # Same scoring as blog.rankings, copied so later changes to it cannot alter this revision.
+    config = current_app.config
+    half_life = config['TRENDING_HALF_LIFE']
+    weights = {'post': config['TRENDING_POST_WEIGHT'], 'comment': config['TRENDING_COMMENT_WEIGHT']}
+
+    def points(kind, when):
+        return math.log(weights[kind]) + when.timestamp() * math.log(2) / half_life
+
+    connection = op.get_bind()
+    scores = {post_id: points('post', date_posted)
+              for post_id, date_posted in connection.execute(sa.select(post.c.id, post.c.date_posted))}
+    for post_id, date_posted in connection.execute(sa.select(comment.c.post_id, comment.c.date_posted)):
+        if post_id in scores:
+            scores[post_id] = _logaddexp(scores[post_id], points('comment', date_posted))
+    rows = [{'post_id': post_id, 'score': score} for post_id, score in scores.items()]
+    for start in range(0, len(rows), batch_size):
+        connection.execute(post_score.insert(), rows[start:start + batch_size])
+
+
+def upgrade():
+    op.create_table('post_score',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    with op.batch_alter_table('post_score', schema=None) as batch_op:
+        batch_op.create_index('ix_post_score_score', [sa.text('score DESC')], unique=False)
+
+    _fill_scores()
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_last_activity', [sa.text('last_activity DESC')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_last_activity')
+
+    with op.batch_alter_table('post_score', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_score_score')
+
+    op.drop_table('post_score')
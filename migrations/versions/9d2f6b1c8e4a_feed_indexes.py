@@ -0,0 +1,42 @@
+"""indexes for feed and comment queries
+
+Revision ID: 9d2f6b1c8e4a
+Revises: 4c1e9a7d2b3f
+Create Date: 2026-10-18 11:03:52.218940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f6b1c8e4a'
+down_revision = '4c1e9a7d2b3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_date_posted_id',
+                              [sa.text('date_posted DESC'), sa.text('id DESC')], unique=False)
+        batch_op.create_index('ix_post_category_id_date_posted_id',
+                              ['category_id', sa.text('date_posted DESC'), sa.text('id DESC')], unique=False)
+        batch_op.create_index('ix_post_user_id_date_posted_id',
+                              ['user_id', sa.text('date_posted DESC'), sa.text('id DESC')], unique=False)
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_post_id_date_posted_id',
+                              ['post_id', sa.text('date_posted DESC'), sa.text('id DESC')], unique=False)
+        batch_op.create_index('ix_comment_author_id', ['author_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_author_id')
+        batch_op.drop_index('ix_comment_post_id_date_posted_id')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_user_id_date_posted_id')
+        batch_op.drop_index('ix_post_category_id_date_posted_id')
+        batch_op.drop_index('ix_post_date_posted_id')
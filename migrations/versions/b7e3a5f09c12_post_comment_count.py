@@ -0,0 +1,28 @@
+"""denormalised comment count on posts
+
+Revision ID: b7e3a5f09c12
+Revises: 9d2f6b1c8e4a
+Create Date: 2026-10-18 12:41:07.553081
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3a5f09c12'
+down_revision = '9d2f6b1c8e4a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute('UPDATE post SET comment_count = (SELECT count(*) FROM comment WHERE comment.post_id = post.id)')
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
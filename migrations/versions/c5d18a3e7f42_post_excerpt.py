@@ -0,0 +1,26 @@
+"""post excerpt for feed previews
+
+Revision ID: c5d18a3e7f42
+Revises: 3a9e7c52d1f8
+Create Date: 2026-10-18 18:04:31.512907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d18a3e7f42'
+down_revision = '3a9e7c52d1f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('excerpt', sa.String(length=250), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('excerpt')
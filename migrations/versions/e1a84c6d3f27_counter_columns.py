@@ -0,0 +1,38 @@
+"""denormalised post and comment counters
+
+Revision ID: e1a84c6d3f27
+Revises: b7e3a5f09c12
+Create Date: 2026-10-18 13:20:44.871532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a84c6d3f27'
+down_revision = 'b7e3a5f09c12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute('UPDATE category SET post_count = (SELECT count(*) FROM post WHERE post.category_id = category.id)')
+    op.execute('UPDATE "user" SET post_count = (SELECT count(*) FROM post WHERE post.user_id = "user".id)')
+    op.execute('UPDATE "user" SET comment_count = (SELECT count(*) FROM comment WHERE comment.author_id = "user".id)')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('post_count')
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_column('post_count')
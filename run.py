@@ -1,4 +1,7 @@
-from blog import app
+from blog import create_app
+
+
+app = create_app()
 
 
 def run_app():
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import pytest
+from blog import create_app, counters, db
+from blog.config import Config
+from blog.models import User, Post, Category, Comment
+
+
+class TestConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'test'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    MAIL_SUPPRESS_SEND = True
+    BCRYPT_LOG_ROUNDS = 4
+    RATE_LIMIT_ENABLED = False
+    SEARCH_BACKEND = 'memory'
+    PAGE_CACHE_WARM_PAGES = 0
+    SUGGEST_BUILD_ON_START = False
+
+
+@pytest.fixture
+def config(tmp_path):
+    return type('TestConfig', (TestConfig,), {
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'AVATAR_FOLDER': str(tmp_path / 'avatars'),
+        'FRAGMENT_CACHE_DIR': str(tmp_path / 'fragment_cache'),
+        'PROFILE_DIR': str(tmp_path / 'profiles'),
+        'RATE_LIMIT_DB': str(tmp_path / 'ratelimit.db'),
+    })
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.drop_all(bind_key=None)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def blog_data(app):
+    with app.app_context():
+        return populate()
+
+
+def populate():
+    start = datetime(2026, 1, 1)
+    users = [User(username=f'user{i}', email=f'user{i}@example.com', password='x') for i in range(3)]
+    categories = [Category(name=f'Category {i}') for i in range(2)]
+    db.session.add_all(users + categories)
+    db.session.flush()
+    posts = []
+    for i in range(8):
+        content = f'Post body {i} ' * 20
+        post = Post(title=f'Post {i}', content=content, excerpt=Post.make_excerpt(content),
+                    user_id=users[i % 3].id, category_id=categories[i % 2].id,
+                    date_posted=start + timedelta(hours=i))
+        db.session.add(post)
+        db.session.flush()
+        counters.post_created(post)
+        posts.append(post)
+    for i in range(24):
+        comment = Comment(text=f'Comment {i}', author_id=users[i % 3].id, post_id=posts[i % 8].id,
+                          date_posted=start + timedelta(days=1, minutes=i))
+        db.session.add(comment)
+        counters.comment_created(comment)
+    db.session.commit()
+    return {'users': [user.id for user in users], 'categories': [category.id for category in categories],
+            'posts': [post.id for post in posts]}
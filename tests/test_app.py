@@ -0,0 +1,20 @@
+from blog import create_app, db
+from blog.database import READER
+
+
+def test_in_memory_app_builds(config):
+    app = create_app(config)
+    with app.app_context():
+        assert 'pool_size' not in app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        assert READER not in db.engines
+        db.create_all(bind_key=None)
+        assert app.test_client().get('/').status_code == 200
+
+
+def test_file_app_gets_pool_and_reader(config, tmp_path):
+    config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "site.db"}'
+    app = create_app(config)
+    with app.app_context():
+        assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == config.SQLITE_WRITER_ENGINE_OPTIONS['pool_size']
+        assert db.engines[READER].pool.size() == config.SQLITE_READER_ENGINE_OPTIONS['pool_size']
+        assert db.engine.pool.size() == config.SQLITE_WRITER_ENGINE_OPTIONS['pool_size']
@@ -0,0 +1,31 @@
+import os
+from blog.cache import FileSystemCache, MemoryCache
+
+
+def test_memory_versions_count_against_max_bytes():
+    cache = MemoryCache(max_bytes=2000)
+    stale = cache.get_version('post:0')
+    cache.set(f'card|post:0@{stale}', 'x' * 100)
+    for post_id in range(1, 1000):
+        cache.bump_version(f'post:{post_id}')
+    assert cache.size <= cache.max_bytes
+    assert len(cache._entries) < 100
+    assert len(cache) == 0
+    assert cache.get_version('post:0') != stale
+
+
+def test_memory_version_is_stable_until_bumped():
+    cache = MemoryCache(max_bytes=2000)
+    version = cache.get_version('post:1')
+    assert cache.get_version('post:1') == version
+    cache.bump_version('post:1')
+    assert cache.get_version('post:1') != version
+
+
+def test_filesystem_prunes_version_files(tmp_path):
+    cache = FileSystemCache(str(tmp_path), threshold=10)
+    for post_id in range(250):
+        cache.bump_version(f'post:{post_id}')
+    versions = [name for name in os.listdir(tmp_path) if name.startswith('v-')]
+    assert len(versions) <= cache.threshold + cache.prune_every
+    assert cache.get_version('post:249') == cache.get_version('post:249')
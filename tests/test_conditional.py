@@ -0,0 +1,39 @@
+from werkzeug.http import http_date
+from datetime import datetime, timedelta, timezone
+from tests.helpers import login
+
+
+def _get(client, path, **headers):
+    return client.get(path, headers=headers)
+
+
+def test_feed_sends_no_last_modified(client, blog_data):
+    response = _get(client, '/')
+    assert response.status_code == 200
+    assert response.headers.get('ETag')
+    assert 'Last-Modified' not in response.headers
+
+
+def test_deleted_post_is_not_answered_with_stale_304(app, client, blog_data):
+    first = _get(client, '/')
+    etag = first.headers['ETag']
+    assert _get(client, '/', **{'If-None-Match': etag}).status_code == 304
+
+    oldest = blog_data['posts'][0]
+    owner = blog_data['users'][0]
+    author = app.test_client()
+    login(author, owner)
+    assert author.post(f'/post/{oldest}/delete').status_code == 302
+
+    since = http_date(datetime.now(timezone.utc) + timedelta(minutes=1))
+    assert _get(client, '/', **{'If-Modified-Since': since}).status_code == 200
+    assert _get(client, '/', **{'If-None-Match': etag}).status_code == 200
+    assert _get(client, '/', **{'If-None-Match': etag, 'If-Modified-Since': since}).status_code == 200
+
+
+def test_post_view_keeps_last_modified(client, blog_data):
+    post_id = blog_data['posts'][0]
+    response = _get(client, f'/post/{post_id}')
+    assert response.last_modified is not None
+    cached = _get(client, f'/post/{post_id}', **{'If-Modified-Since': response.headers['Last-Modified']})
+    assert cached.status_code == 304
@@ -0,0 +1,60 @@
+from sqlalchemy import update
+from blog import counters, db
+from blog.models import User, Post, Category, Comment
+
+
+def _drift():
+    return dict(counters.reconcile(fix=False))
+
+
+def test_counters_follow_creates_and_deletes(app, blog_data):
+    author_id, commenter_id = blog_data['users'][2], blog_data['users'][0]
+    category_id = blog_data['categories'][1]
+    with app.app_context():
+        author, commenter = db.session.get(User, author_id), db.session.get(User, commenter_id)
+        category = db.session.get(Category, category_id)
+        posts, comments, category_posts = author.post_count, commenter.comment_count, category.post_count
+
+        post = Post(title='Counted', content='Body', excerpt='Body', user_id=author_id, category_id=category_id)
+        db.session.add(post)
+        db.session.flush()
+        counters.post_created(post)
+        comment = Comment(text='First', author_id=commenter_id, post_id=post.id)
+        db.session.add(comment)
+        counters.comment_created(comment)
+        db.session.commit()
+        db.session.expire_all()
+        assert (post.comment_count, author.post_count, commenter.comment_count, category.post_count) == \
+            (1, posts + 1, comments + 1, category_posts + 1)
+
+        counters.comment_deleted(comment)
+        db.session.delete(comment)
+        second = Comment(text='Second', author_id=commenter_id, post_id=post.id)
+        db.session.add(second)
+        counters.comment_created(second)
+        db.session.commit()
+        db.session.expire_all()
+        assert (post.comment_count, commenter.comment_count) == (1, comments + 1)
+
+        counters.post_deleted(post)
+        db.session.delete(post)
+        db.session.commit()
+        db.session.expire_all()
+        assert (author.post_count, commenter.comment_count, category.post_count) == \
+            (posts, comments, category_posts)
+        assert set(_drift().values()) == {0}
+
+
+def test_reconcile_reports_and_repairs_drift(app, blog_data):
+    post_id, user_id = blog_data['posts'][0], blog_data['users'][1]
+    with app.app_context():
+        expected = db.session.get(Post, post_id).comment_count, db.session.get(User, user_id).post_count
+        db.session.execute(update(Post).where(Post.id == post_id).values(comment_count=99))
+        db.session.execute(update(User).where(User.id == user_id).values(post_count=0))
+        db.session.commit()
+
+        assert counters.reconcile(fix=True) == [('Post.comment_count', 1), ('Category.post_count', 0),
+                                                 ('User.post_count', 1), ('User.comment_count', 0)]
+        db.session.expire_all()
+        assert (db.session.get(Post, post_id).comment_count, db.session.get(User, user_id).post_count) == expected
+        assert set(_drift().values()) == {0}
@@ -0,0 +1,15 @@
+from sqlalchemy import update
+from blog import db
+from blog.models import Post
+from blog.posts.utils import backfill_excerpts
+
+
+def test_backfill_replaces_cached_cards(app, client, blog_data):
+    assert b'Post body 7' in client.get('/').data
+    with app.app_context():
+        db.session.execute(update(Post).values(content='Rewritten body', excerpt=None))
+        db.session.commit()
+        assert backfill_excerpts() == len(blog_data['posts'])
+    body = client.get('/').data
+    assert b'Rewritten body' in body
+    assert b'Post body 7' not in body
@@ -0,0 +1,13 @@
+from blog.commands import explain, full_scans, route_queries
+
+
+def test_route_queries_use_indexes(app, blog_data):
+    with app.app_context():
+        scans = {name: full_scans(explain(query)) for name, query, scan_allowed in route_queries()
+                 if not scan_allowed}
+    assert {name: steps for name, steps in scans.items() if steps} == {}
+
+
+def test_db_explain_command_passes(app, blog_data):
+    result = app.test_cli_runner().invoke(args=['db-explain'])
+    assert result.exit_code == 0, result.output
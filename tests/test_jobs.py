@@ -0,0 +1,70 @@
+import time
+from datetime import datetime, timedelta
+from threading import Event, Thread
+import pytest
+from sqlalchemy import select
+from blog import db, mail
+from blog.jobs import Worker
+from blog.models import Job
+
+SMTP_DELAY = 1.0
+
+
+@pytest.fixture
+def config(config, tmp_path):
+    config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "site.db"}'
+    config.JOBS_RUN_IN_PROCESS = False
+    config.JOBS_POLL_INTERVAL = 0.05
+    return config
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    sent = []
+    delivered = Event()
+
+    def slow_send(message):
+        time.sleep(SMTP_DELAY)
+        sent.append(message)
+        delivered.set()
+
+    monkeypatch.setattr(mail, 'send', slow_send)
+    return sent, delivered
+
+
+@pytest.fixture
+def worker(app):
+    worker = Worker(app, concurrency=1)
+    thread = Thread(target=worker.run, daemon=True)
+    thread.start()
+    yield worker
+    worker.stop()
+    thread.join()
+
+
+def test_reset_email_is_delivered_off_the_request(app, client, blog_data, outbox, worker):
+    sent, delivered = outbox
+    latencies = []
+    for _ in range(3):
+        started = time.perf_counter()
+        response = client.post('/reset_password', data={'email': 'user0@example.com'})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 302
+    assert max(latencies) < SMTP_DELAY / 2
+    assert delivered.wait(SMTP_DELAY * 5)
+    assert sent[0].recipients == ['user0@example.com']
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(app):
+    worker = Worker(app, concurrency=1)
+    expired = datetime.now() - timedelta(seconds=1)
+    with app.app_context():
+        db.session.add_all([Job(name='send_reset_email', payload='{}', status='running', run_at=expired,
+                                attempts=app.config['JOBS_MAX_ATTEMPTS']),
+                            Job(name='send_reset_email', payload='{}', status='running', run_at=expired, attempts=1)])
+        db.session.commit()
+        claimed = worker.claim()
+        assert claimed.attempts == 2
+        assert worker.claim() is None
+        statuses = dict(db.session.execute(select(Job.attempts, Job.status)).all())
+    assert statuses == {app.config['JOBS_MAX_ATTEMPTS']: 'failed', 2: 'running'}
@@ -0,0 +1,17 @@
+from blog.page_cache import page_cache
+
+
+def _get(client, path, **headers):
+    return client.get(path, headers=headers)
+
+
+def test_etag_from_a_miss_revalidates_against_a_hit(client, blog_data):
+    for path in ('/', f'/category/{blog_data["categories"][0]}/', f'/post/{blog_data["posts"][0]}'):
+        misses = page_cache.misses
+        first = _get(client, path)
+        assert first.status_code == 200 and page_cache.misses == misses + 1
+        hits = page_cache.hits
+        again = _get(client, path, **{'If-None-Match': first.headers['ETag']})
+        assert page_cache.hits == hits + 1
+        assert again.status_code == 304
+        assert again.headers['ETag'] == first.headers['ETag']
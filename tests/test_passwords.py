@@ -0,0 +1,35 @@
+import bcrypt
+import pytest
+from blog import db
+from blog.models import User
+from blog.users.passwords import PasswordHasher, PasswordServiceBusy, passwords
+
+SLOW_HASH = bcrypt.hashpw(b'secret', bcrypt.gensalt(14)).decode()
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=0, timeout=0.05)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_slow_hash_times_out_as_busy(hasher):
+    with pytest.raises(PasswordServiceBusy):
+        hasher.check(SLOW_HASH, 'secret')
+    # The abandoned hash keeps its slot until the worker finishes it.
+    with pytest.raises(PasswordServiceBusy):
+        hasher.check(SLOW_HASH, 'secret')
+    hasher.shutdown()
+    hasher.timeout = 30
+    assert hasher.check(SLOW_HASH, 'secret')
+
+
+def test_login_with_slow_hash_answers_503(app, client):
+    with app.app_context():
+        db.session.add(User(username='slow', email='slow@example.com', password=SLOW_HASH))
+        db.session.commit()
+    passwords.timeout = 0.05
+    response = client.post('/login', data={'email': 'slow@example.com', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(PasswordServiceBusy.retry_after)
@@ -0,0 +1,57 @@
+import re
+import pytest
+from blog import counters, db
+from blog.cache import fragment_cache
+from blog.models import User, Post, Comment
+from tests.helpers import login
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+HYDRATED = re.compile(r'desc="(\d+) rows"')
+PAGES = {
+    'home': lambda data: '/',
+    'category': lambda data: f'/category/{data["categories"][0]}/',
+    'post': lambda data: f'/post/{data["posts"][0]}',
+    'account': lambda data: f'/account/{data["users"][0]}',
+}
+# One page of 3 posts with their authors and categories, plus the sidebar categories.
+ROWS = {'home': 11, 'category': 11, 'post': 2, 'account': 8}
+
+
+def _queries(client, url):
+    client.get(url)
+    fragment_cache.backend.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    return int(QUERIES.search(timing).group(1)), int(HYDRATED.search(timing).group(1))
+
+
+def _grow(data):
+    users = [User(username=f'extra{i}', email=f'extra{i}@example.com', password='x') for i in range(10)]
+    db.session.add_all(users)
+    db.session.flush()
+    for i in range(40):
+        post = Post(title=f'Extra {i}', content='Extra body', excerpt='Extra body', user_id=users[i % 10].id,
+                    category_id=data['categories'][0])
+        db.session.add(post)
+        db.session.flush()
+        counters.post_created(post)
+        for author in users[:5]:
+            comment = Comment(text='Extra comment', author_id=author.id, post_id=data['posts'][0])
+            db.session.add(comment)
+            counters.comment_created(comment)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('authenticated', [False, True])
+@pytest.mark.parametrize('page', sorted(PAGES))
+def test_queries_and_rows_do_not_grow_with_the_data(app, client, blog_data, page, authenticated):
+    if authenticated:
+        login(client, blog_data['users'][1])
+    url = PAGES[page](blog_data)
+    queries, rows = _queries(client, url)
+    assert queries <= 8 and rows <= ROWS[page]
+    with app.app_context():
+        _grow(blog_data)
+    queries_after, rows_after = _queries(client, url)
+    assert queries_after == queries and rows_after <= ROWS[page]
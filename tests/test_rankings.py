@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete
+from blog import db
+from blog.cache import fragment_cache
+from blog.models import Comment, Post, PostScore
+from blog.rankings import ACTIVE, rankings
+from blog.users.activity import activity
+
+
+def _visit(user_ids, start):
+    for offset, user_id in enumerate(user_ids):
+        activity.record(user_id, start + timedelta(seconds=offset))
+    activity.flush()
+
+
+def test_active_users_reordering_keeps_cached_pages(app, blog_data):
+    users = blog_data['users']
+    now = datetime.utcnow()
+    rankings.size = 2
+    with app.app_context():
+        _visit(users[:2], now)
+        version = fragment_cache.backend.get_version(ACTIVE)
+        _visit(reversed(users[:2]), now + timedelta(minutes=1))
+        assert fragment_cache.backend.get_version(ACTIVE) == version
+        _visit(users[2:], now + timedelta(minutes=2))
+        assert fragment_cache.backend.get_version(ACTIVE) != version
+        names = [entry['username'] for entry in rankings.active()]
+        assert len(names) == 2 and names == sorted(names, key=str.lower)
+
+
+def test_first_event_on_unscored_post_counts_the_post(app, blog_data):
+    post_id = blog_data['posts'][0]
+    with app.app_context():
+        db.session.execute(delete(PostScore).where(PostScore.post_id == post_id))
+        post = db.session.get(Post, post_id)
+        db.session.add(Comment(text='First since rankings', author_id=blog_data['users'][0], post_id=post_id,
+                               date_posted=post.date_posted))
+        db.session.commit()
+        expected = rankings.score(post.date_posted, [comment.date_posted for comment in post.comments])
+        assert db.session.get(PostScore, post_id).score == pytest.approx(expected, abs=1e-6)
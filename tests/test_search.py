@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import event
+from blog import create_app, db
+from blog.database import READER
+from blog.models import User, Post, Category
+from blog.posts.search import Fts5Backend, MemoryBackend, search_engine
+
+
+@pytest.fixture
+def file_app(config, tmp_path):
+    config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "site.db"}'
+    config.SEARCH_BACKEND = 'fts5'
+    app = create_app(config)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        user = User(username='writer', email='writer@example.com', password='x')
+        category = Category(name='Notes')
+        db.session.add_all([user, category])
+        db.session.flush()
+        for title in ('Indexing sqlite', 'Tuning flask', 'Caching templates'):
+            db.session.add(Post(title=title, content=f'{title} in depth', user_id=user.id, category_id=category.id))
+        db.session.commit()
+    return app
+
+
+def _record(app):
+    statements = []
+    with app.app_context():
+        for name, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda conn, cursor, sql, params, context, executemany, name=name:
+                         statements.append((name, sql)))
+    return statements
+
+
+def test_search_reads_through_the_reader_without_ddl(file_app):
+    with file_app.app_context():
+        assert search_engine.rebuild() == 3
+    statements = _record(file_app)
+    response = file_app.test_client().get('/search', query_string={'q': 'sqlite'})
+    assert response.status_code == 200
+    assert 'Indexing' in response.get_data(as_text=True)
+    matches = [name for name, sql in statements if 'MATCH' in sql]
+    assert matches == [READER]
+    assert not [sql for _, sql in statements if sql.lstrip().upper().startswith(('CREATE', 'DROP'))]
+
+
+def test_missing_fts_table_falls_back_to_memory(file_app):
+    with file_app.app_context():
+        assert isinstance(search_engine.backend(db.session.connection()), MemoryBackend)
+        response = file_app.test_client().get('/search', query_string={'q': 'flask'})
+        assert 'Tuning' in response.get_data(as_text=True)
+        search_engine.rebuild()
+        assert isinstance(search_engine.backend(db.session.connection()), Fts5Backend)
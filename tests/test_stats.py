@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', ['/stats/cache', '/stats/requests'])
+def test_stats_are_hidden_by_default(client, url):
+    assert client.get(url).status_code == 404
+
+
+@pytest.mark.parametrize('url', ['/stats/cache', '/stats/requests'])
+def test_stats_can_be_enabled(app, client, url):
+    app.config['STATS_ENABLED'] = True
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.is_json
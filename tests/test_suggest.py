@@ -0,0 +1,11 @@
+from blog.posts.suggest import suggestions
+
+
+def test_suggestions_build_in_the_background(client, blog_data):
+    response = client.get('/suggest?q=post')
+    assert response.json['suggestions'] == []
+    assert response.cache_control.no_store
+    suggestions._thread.join()
+    response = client.get('/suggest?q=post')
+    assert {item['label'] for item in response.json['suggestions']} == {f'Post {i}' for i in range(8)}
+    assert response.cache_control.max_age